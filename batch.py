@@ -0,0 +1,280 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+
+from loguru import logger
+
+from diagnostics import diagnostics
+from interfaces import remove_stale_writes
+import main as cli
+from morfeus import TableBackend, set_backend
+
+try:
+    import resource
+except ImportError:  # Windows, ограничение памяти недоступно
+    resource = None
+
+
+DONE = 'done'
+FAILED = 'failed'
+
+DOCUMENT = 'document'  # сводка диагностики по каждому документу.
+BATCH = 'batch'  # одна сводка диагностики по всему пакету.
+
+
+class BatchError(Exception):
+    pass
+
+
+class Job:
+    """
+    Задание пакетной обработки: шаблон, данные и путь до нового документа.
+    """
+    def __init__(self, docx: Path, data: Path, out: Path):
+        self.docx = docx
+        self.data = data
+        self.out = out
+
+    @property
+    def id(self) -> str:
+        """ Идентификатор задания в журнале - путь до нового документа. """
+        return self.out.as_posix()
+
+    def input_hash(self) -> str:
+        """ Хэш содержимого шаблона и данных, изменение входных документов перезапускает задание. """
+        h = hashlib.sha256()
+        for path in (self.docx, self.data):
+            try:
+                with path.open('rb') as f:
+                    while chunk := f.read(1 << 16):
+                        h.update(chunk)
+            except OSError:
+                h.update(b'\0missing\0')  # отсутствующий документ приведет к ошибке при обработке
+        return h.hexdigest()
+
+
+def read_manifest(path: Path) -> list[Job]:
+    """
+    Читает манифест заданий: json lines документ, каждая строка которого - объект
+    {"docx": "шаблон.docx", "data": "данные.xlsx", "out": "новый.docx"}.
+
+    :param path: путь до манифеста.
+    :return: задания.
+    """
+    jobs = []
+    try:
+        with path.open(encoding='utf8') as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    jobs.append(Job(Path(item['docx']), Path(item['data']), Path(item['out'])))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    raise BatchError(f'Некорректное задание в строке {n} манифеста "{path}".')
+    except OSError:
+        raise BatchError(f'Не удалось прочитать манифест "{path}".')
+    if len({job.id for job in jobs}) != len(jobs):
+        raise BatchError(f'Манифест "{path}" содержит несколько заданий с одинаковым out.')
+    return jobs
+
+
+class Journal:
+    """
+    Журнал выполнения заданий в формате json lines. Каждая завершенная попытка задания дописывается
+    в конец журнала, поэтому журнал переживает аварийное завершение пакета.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._last: dict[str, dict] = {}  # Маппинг задания на последнюю запись о нем.
+        self._failures: Counter[tuple[str, str]] = Counter()  # Неудачные попытки задания с данным хэшем.
+        if path.exists():
+            with path.open(encoding='utf8') as f:
+                for line in f:
+                    try:
+                        self._add(json.loads(line))
+                    except json.JSONDecodeError:  # запись, оборванная аварийным завершением
+                        continue
+
+    def _add(self, record: dict):
+        self._last[record['job']] = record
+        if record['status'] == FAILED:
+            self._failures[(record['job'], record['hash'])] += 1
+
+    def is_done(self, job: Job, input_hash: str) -> bool:
+        """ Задание выполнено с теми же входными документами и новый документ на месте. """
+        record = self._last.get(job.id)
+        return bool(record) and record['status'] == DONE and record['hash'] == input_hash and job.out.exists()
+
+    def failures(self, job: Job, input_hash: str) -> int:
+        """ Колличество неудачных попыток задания с теми же входными документами. """
+        return self._failures[(job.id, input_hash)]
+
+    def write(self, job: Job, input_hash: str, status: str, *, error: str = None, elapsed: float = None):
+        record = {'job': job.id, 'hash': input_hash, 'status': status, 'error': error,
+                  'elapsed': round(elapsed, 3) if elapsed is not None else None}
+        with self.path.open('a', encoding='utf8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._add(record)
+
+
+def _run_job(job: Job, conn: Connection, memory: int | None, normalize: bool, morph_table: Path | None):
+    """
+    Выполняет задание в отдельном процессе и отправляет в conn текст ошибки или None
+    вместе с событиями диагностики задания (см. Diagnostics.drain).
+    """
+    if memory and resource is not None:
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    error = None
+    try:
+        if morph_table:
+            set_backend(TableBackend(morph_table))
+        cli.render(job.docx, job.data, job.out, normalize=normalize)
+    except Exception as e:  # ошибка любого документа не должна останавливать пакет
+        error = f'{type(e).__name__}: {e}'
+    conn.send((error, *diagnostics.drain()))
+
+
+def run_batch(jobs: list[Job], journal: Journal, *, workers: int = 1, retries: int = 1, timeout: float = None,
+              memory: int = None, normalize: bool = False, morph_table: Path = None,
+              diagnostics_scope: str = DOCUMENT) -> Counter[str]:
+    """
+    Выполняет задания, пропуская выполненные по журналу. Каждое задание выполняется в отдельном процессе,
+    процесс, превысивший timeout, завершается. Неудачные задания повторяются не более retries раз с учетом
+    попыток из журнала.
+
+    :param jobs: задания.
+    :param journal: журнал выполнения.
+    :param workers: колличество одновременно выполняемых заданий.
+    :param retries: колличество повторов неудачного задания.
+    :param timeout: ограничение времени выполнения задания в секундах.
+    :param memory: ограничение памяти процесса задания в МБ (только POSIX).
+    :param normalize: объединить блоки текста в шаблонах (см. TaggedDoc.normalize_runs).
+    :param morph_table: путь до таблицы склонений.
+    :param diagnostics_scope: выводить сводку диагностики по каждому документу (document) или по пакету (batch).
+    :return: колличество заданий по статусам: done, failed, skipped.
+    """
+    ctx = multiprocessing.get_context()
+    workers = max(workers, 1)
+    stats: Counter[str] = Counter()
+    pending: deque[tuple[Job, str]] = deque()
+    for job in jobs:
+        h = job.input_hash()
+        if journal.is_done(job, h):
+            stats['skipped'] += 1
+        elif journal.failures(job, h) > retries:
+            stats[FAILED] += 1  # попытки исчерпаны в предыдущих запусках
+        else:
+            pending.append((job, h))
+
+    # Маппинг канала результата на процесс задания. Канал готов к чтению, когда процесс отправил результат
+    # или завершился, поэтому результат любого размера читается до завершения процесса.
+    active: dict[Connection, tuple[multiprocessing.Process, Job, str, float]] = {}
+    while pending or active:
+        while pending and len(active) < workers:
+            job, h = pending.popleft()
+            job.out.parent.mkdir(parents=True, exist_ok=True)
+            remove_stale_writes(job.out)  # процесс, убитый по таймауту, не удаляет свой временный файл
+            reader, writer = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_run_job, args=(job, writer, memory, normalize, morph_table), daemon=True)
+            proc.start()
+            writer.close()
+            active[reader] = (proc, job, h, time.monotonic())
+
+        now = time.monotonic()
+        wait_for = min((started + timeout - now for *_, started in active.values()), default=None) \
+            if timeout else None
+        ready = set(wait(list(active), timeout=max(wait_for, 0) if wait_for is not None else None))
+        now = time.monotonic()
+        for reader, (proc, job, h, started) in list(active.items()):
+            elapsed = now - started
+            if reader in ready:
+                try:
+                    result = reader.recv()  # до join: процесс не завершится, пока результат не прочитан
+                except EOFError:  # процесс завершился, не отправив результат (например, убит системой)
+                    result = None
+                proc.join()
+                if result is None:
+                    error = f'процесс завершился с кодом {proc.exitcode}'
+                else:
+                    error, summary, levels = result
+                    diagnostics.merge(summary, levels)
+            elif timeout and elapsed >= timeout:
+                proc.kill()
+                proc.join()
+                error = f'превышено время выполнения {timeout} с'
+            else:
+                continue
+            reader.close()
+            del active[reader]
+            if diagnostics_scope == DOCUMENT:
+                diagnostics.flush(job.id)
+            if error is None:
+                journal.write(job, h, DONE, elapsed=elapsed)
+                stats[DONE] += 1
+                continue
+            journal.write(job, h, FAILED, error=error, elapsed=elapsed)
+            logger.error(f'Задание {job.id}: {error}')
+            if journal.failures(job, h) <= retries:
+                pending.append((job, h))
+            else:
+                stats[FAILED] += 1
+    diagnostics.flush()
+    return stats
+
+
+def add_diagnostics_arguments(parser: argparse.ArgumentParser):
+    """ Добавляет параметры сводки диагностики пакета. """
+    parser.add_argument('--diagnostics', choices=('text', 'json'), default='text', help='формат сводки предупреждений.')
+    parser.add_argument('--diagnostics-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default='WARNING',
+                        help='минимальный уровень событий, попадающих в сводку.')
+    parser.add_argument('--diagnostics-scope', choices=(DOCUMENT, BATCH), default=DOCUMENT,
+                        help='выводить сводку по каждому документу или одну сводку по пакету.')
+
+
+def main():
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, format="<level>{level}</level> | <level>{message}</level>")
+    parser = argparse.ArgumentParser(description='Пакетное заполнение шаблонов docx с журналом и возобновлением.')
+    parser.add_argument('manifest', type=str, help='путь до манифеста заданий (json lines: docx, data, out).')
+    parser.add_argument('--journal', type=str, help='путь до журнала, по умолчанию <манифест>.journal.jsonl.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='колличество одновременно выполняемых заданий.')
+    parser.add_argument('--retries', type=int, default=1, help='колличество повторов неудачного задания.')
+    parser.add_argument('--timeout', type=float, help='ограничение времени выполнения задания в секундах.')
+    parser.add_argument('--memory', type=int, help='ограничение памяти процесса задания в МБ.')
+    parser.add_argument('-m', '--morph-table', type=str, help='путь до таблицы склонений (см. morfeus.py).')
+    parser.add_argument('-n', '--normalize', action='store_true',
+                        help='объединить блоки текста с одинаковым форматированием в параграфах шаблонов с тэгами.')
+    add_diagnostics_arguments(parser)
+    args = parser.parse_args()
+
+    manifest = Path(args.manifest)
+    try:
+        jobs = read_manifest(manifest)
+    except BatchError as e:
+        logger.error(e)
+        exit(1)
+    journal = Journal(Path(args.journal) if args.journal else manifest.with_suffix('.journal.jsonl'))
+    diagnostics.configure(args.diagnostics_level, args.diagnostics)
+    stats = run_batch(jobs, journal, workers=args.jobs, retries=args.retries, timeout=args.timeout,
+                      memory=args.memory, normalize=args.normalize,
+                      morph_table=Path(args.morph_table) if args.morph_table else None,
+                      diagnostics_scope=args.diagnostics_scope)
+    logger.info(f'Выполнено: {stats[DONE]}, пропущено: {stats["skipped"]}, с ошибкой: {stats[FAILED]}. '
+                f'Журнал: {journal.path.as_posix()}.')
+    if stats[FAILED]:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
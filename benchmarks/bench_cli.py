@@ -0,0 +1,203 @@
+"""
+Замер пропускной способности и задержек полного цикла main.py на сгенерированном наборе
+шаблонов и xlsx документов разного размера: многократно в одном процессе и в отдельных процессах
+(с запуском интерпретатора, импортами и загрузкой словарей). Метрики считаются по каждому размеру.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_cli [--sizes 10,100,1000] [--repeat 5] [--mode both]
+                                   [--baseline bench_baseline.json [--save-baseline]]
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import openpyxl
+from docx import Document
+from loguru import logger
+
+import main as cli
+from interfaces import DocxEnumTag
+from xlsxparser import TagData
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MAIN = Path(cli.__file__)
+STUDENTS_PER_ORG = 25  # колличество студентов в одной организации сгенерированных данных.
+
+
+def make_template(path: Path, size: int):
+    """ Создает шаблон со всеми тэгами, колличество параграфов с тэгами растет с size. """
+    doc = Document()
+    doc.add_paragraph(f'Об <{DocxEnumTag.KIND.value}:loct>')
+    for _ in range(size // 10 + 1):
+        doc.add_paragraph(' '.join(f'<{tag.value}:gent>' if tag == DocxEnumTag.FACULTY else f'<{tag.value}>'
+                                   for tag in DocxEnumTag if tag not in (DocxEnumTag.TABLES, DocxEnumTag.STUDENTS)))
+    doc.add_paragraph(f'<{DocxEnumTag.TABLES.value}>')
+    doc.save(path)
+
+
+def make_workbook(path: Path, size: int):
+    """ Создает xlsx документ со всеми полями и списком из size студентов. """
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    tables = None
+    for canon, field in TagData().help_iter():
+        if field.owner == DocxEnumTag.TABLES:
+            tables = canon
+        else:
+            sheet.append((canon, 'Учебная практика'))
+    for i in range(size):
+        if i % STUDENTS_PER_ORG == 0:
+            sheet.append((None,))
+            sheet.append((tables, f'Организация {i // STUDENTS_PER_ORG + 1}'))
+        sheet.append((None, f'Иванов Иван Иванович {i}', 'б'))
+    wb.save(path)
+
+
+def make_corpus(root: Path, sizes: list[int]) -> list[tuple[int, Path, Path]]:
+    """ Создает шаблон и xlsx документ для каждого размера. """
+    corpus = []
+    for size in sizes:
+        template, workbook = root / f'template-{size}.docx', root / f'data-{size}.xlsx'
+        make_template(template, size)
+        make_workbook(workbook, size)
+        corpus.append((size, template, workbook))
+    return corpus
+
+
+def run_in_process(template: Path, workbook: Path, out: Path):
+    argv = sys.argv
+    sys.argv = [MAIN.as_posix(), template.as_posix(), workbook.as_posix(), '-o', out.as_posix()]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # main пишет лог в sys.stdout
+            cli.main()
+    except SystemExit as e:
+        raise RuntimeError(f'main завершился с кодом {e.code} на {template}, {workbook}.')
+    finally:
+        sys.argv = argv
+        logger.remove()
+
+
+def run_subprocess(template: Path, workbook: Path, out: Path):
+    subprocess.run([sys.executable, MAIN.as_posix(), template.as_posix(), workbook.as_posix(), '-o', out.as_posix()],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """ Перцентиль p (0-100) методом ближайшего ранга. """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def peak_rss_mb(children: bool) -> float | None:
+    """ Пиковое потребление памяти текущим процессом или самым большим из дочерних процессов. """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == 'darwin' else 1)  # байты на macOS, килобайты на Linux
+
+
+def _measure_size(mode: str, template: Path, workbook: Path, repeat: int, out: Path) -> dict:
+    """ Прогоняет один размер корпуса repeat раз в режиме mode и возвращает метрики. """
+    run = run_in_process if mode == 'in-process' else run_subprocess
+    latencies = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run(template, workbook, out)
+        latencies.append(time.perf_counter() - t)
+    return {
+        'documents': len(latencies),
+        'docs_per_s': len(latencies) / sum(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_mb': peak_rss_mb(children=mode == 'subprocess'),
+    }
+
+
+def measure(mode: str, corpus: list[tuple[int, Path, Path]], repeat: int, out: Path) -> dict[str, dict]:
+    """
+    Прогоняет корпус repeat раз в режиме mode и возвращает метрики по каждому размеру. Каждый размер
+    замеряется в новом процессе, поэтому пиковая память не включает генерацию корпуса и другие размеры.
+    """
+    results = {}
+    for size, template, workbook in corpus:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results[str(size)] = executor.submit(_measure_size, mode, template, workbook, repeat, out).result()
+    return results
+
+
+def compare(results: dict, baseline: dict, *, max_throughput_drop: float, max_latency_rise: float,
+            max_rss_rise: float) -> list[str]:
+    """ Возвращает описания регрессий results относительно baseline по каждому режиму и размеру. """
+    regressions = []
+    for mode, sizes in results.items():
+        for size, metrics in sizes.items():
+            if not (base := baseline.get(mode, {}).get(size)):
+                continue
+            name = f'{mode} {size}'
+            if metrics['docs_per_s'] < base['docs_per_s'] * (1 - max_throughput_drop):
+                regressions.append(f'{name}: docs/s {metrics["docs_per_s"]:.2f} < {base["docs_per_s"]:.2f}')
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if metrics[key] > base[key] * (1 + max_latency_rise):
+                    regressions.append(f'{name}: {key} {metrics[key]:.1f} > {base[key]:.1f}')
+            if metrics['peak_rss_mb'] and base.get('peak_rss_mb') and \
+                    metrics['peak_rss_mb'] > base['peak_rss_mb'] * (1 + max_rss_rise):
+                regressions.append(f'{name}: peak_rss_mb {metrics["peak_rss_mb"]:.1f} > {base["peak_rss_mb"]:.1f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер полного цикла main.py на сгенерированных документах.')
+    parser.add_argument('--sizes', type=str, default='10,100,1000', help='размеры списков студентов через запятую.')
+    parser.add_argument('--repeat', type=int, default=5, help='колличество прогонов корпуса.')
+    parser.add_argument('--mode', choices=('in-process', 'subprocess', 'both'), default='both')
+    parser.add_argument('--baseline', type=str, help='путь до json файла с базовыми метриками.')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить метрики как базовые.')
+    parser.add_argument('--max-throughput-drop', type=float, default=0.1, help='допустимое падение docs/s (доля).')
+    parser.add_argument('--max-latency-rise', type=float, default=0.2, help='допустимый рост задержек (доля).')
+    parser.add_argument('--max-rss-rise', type=float, default=0.2, help='допустимый рост пиковой памяти (доля).')
+    args = parser.parse_args()
+
+    modes = ('in-process', 'subprocess') if args.mode == 'both' else (args.mode,)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus = make_corpus(root, [int(size) for size in args.sizes.split(',')])
+        results = {mode: measure(mode, corpus, args.repeat, root / 'out.docx') for mode in modes}
+
+    for mode, sizes in results.items():
+        for size, m in sizes.items():
+            rss = f'{m["peak_rss_mb"]:.1f} МБ' if m['peak_rss_mb'] is not None else '-'
+            print(f'{mode}, {size} студ.: {m["documents"]} док., {m["docs_per_s"]:.2f} док/с, '
+                  f'p50 {m["p50_ms"]:.1f} мс, p95 {m["p95_ms"]:.1f} мс, p99 {m["p99_ms"]:.1f} мс, пиковая память {rss}')
+
+    if not args.baseline:
+        return
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2), encoding='utf8')
+        print(f'Базовые метрики сохранены в {baseline_path}.')
+        return
+    regressions = compare(results, json.loads(baseline_path.read_text(encoding='utf8')),
+                          max_throughput_drop=args.max_throughput_drop, max_latency_rise=args.max_latency_rise,
+                          max_rss_rise=args.max_rss_rise)
+    if regressions:
+        print('Регрессии относительно базовых метрик:\n' + '\n'.join(regressions))
+        exit(1)
+    print('Регрессий относительно базовых метрик нет.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Замер стоимости добавления строки в DocxTable с кэшем стилей и без него.
+
+Запуск из корня репозитория: python -m benchmarks.bench_table [-r ROWS]
+"""
+import argparse
+import timeit
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.shared import Inches
+
+from table import DocxTable, StyleCache
+
+
+class NoStyleCache(StyleCache):
+    """ Поиск стиля по имени при каждом обращении, как при p.style = name. """
+
+    def get_id(self, name: str | None, style_type: WD_STYLE_TYPE) -> str | None:
+        return self._part.get_style_id(name, style_type)
+
+
+def bench(styles_cls: type[StyleCache], rows: int) -> float:
+    """ Возвращает среднее время добавления строки в секундах. """
+    doc = Document()
+    p = doc.add_paragraph()
+    table = DocxTable(p, width=doc._block_width, columns_width=(Inches(5),), styles=styles_cls(doc.part))
+    table.make_base_headings()
+
+    def add_rows():
+        for i in range(rows):
+            table.add_row(f'{i}. Иванов Иван Иванович', 'ИТси-210, б', 'ст. преп.', 'Дмитриев Н.В',
+                          p_style='Heading 6')
+
+    return timeit.timeit(add_rows, number=1) / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер стоимости добавления строки в таблицу.')
+    parser.add_argument('-r', '--rows', type=int, default=2000, help='колличество строк.')
+    args = parser.parse_args()
+
+    before = bench(NoStyleCache, args.rows)
+    after = bench(StyleCache, args.rows)
+    print(f'без кэша стилей: {before * 1e6:.1f} мкс/строка')
+    print(f'с кэшем стилей:  {after * 1e6:.1f} мкс/строка')
+    print(f'ускорение: {before / after:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
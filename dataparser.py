@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterator, BinaryIO, TextIO
+
+from interfaces import raise_invalid_path
+from xlsxparser import RowDataParser, XlsxDataParser, XlsxDataParserError
+
+
+class DataParserError(XlsxDataParserError):
+    pass
+
+
+def _normalize_row(row: list) -> tuple:
+    """
+    Приводит ряд к виду ряда листа xlsx: пустые значения заменяются на None,
+    пустой ряд состоит из одного None.
+    """
+    if not row:
+        return None,
+    return tuple(None if value == '' else value for value in row)
+
+
+class _TextDataParser(RowDataParser):
+    """
+    Базовый парсер текстового документа, читаемого с диска или из уже прочитанного содержимого.
+    """
+    streamable = True
+    exts: tuple[str, ...] = ()
+
+    def __init__(self, path: Path, *, source: BinaryIO = None):
+        """
+        :param path: путь до документа.
+        :param source: уже прочитанное содержимое документа, path в этом случае используется только в сообщениях.
+        """
+        if source is None:
+            raise_invalid_path(path, DataParserError, exts=self.exts)
+        self.path = path
+        self.source = source
+
+    def _open(self) -> TextIO:
+        if self.source is not None:
+            return io.TextIOWrapper(self.source, encoding='utf-8-sig', newline='')
+        return self.path.open(newline='', encoding='utf-8-sig')
+
+
+class CsvDataParser(_TextDataParser):
+    """
+    Парсер данных csv документа. Ряды документа повторяют ряды листа xlsx.
+    """
+    exts = ('.csv',)
+
+    def __init__(self, path: Path, *, source: BinaryIO = None, delimiter: str = ','):
+        super().__init__(path, source=source)
+        self.delimiter = delimiter
+
+    def _rows(self) -> Iterator[tuple]:
+        try:
+            with self._open() as f:
+                for row in csv.reader(f, delimiter=self.delimiter):
+                    yield _normalize_row(row)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise DataParserError(f'Документ "{self.path}" не является csv документом: {e}')
+
+
+class JsonDataParser(_TextDataParser):
+    """
+    Парсер данных в формате json lines: каждая строка документа - json массив,
+    повторяющий ряд листа xlsx, например ["Курс", 2] или [null, "Иванов Иван Иванович", "б"].
+    """
+    exts = ('.jsonl',)
+
+    def _rows(self) -> Iterator[tuple]:
+        try:
+            with self._open() as f:
+                for n, line in enumerate(f, 1):
+                    row = json.loads(line) if line.strip() else []
+                    if not isinstance(row, list):
+                        raise DataParserError(f'Строка {n} документа "{self.path}" не является json массивом.')
+                    yield _normalize_row(row)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise DataParserError(f'Документ "{self.path}" не является json lines документом: {e}')
+
+
+class SqliteDataParser(RowDataParser):
+    """
+    Парсер данных из базы SQLite. Запрос query должен возвращать ряды в формате листа xlsx,
+    по умолчанию ряды читаются из таблицы tag_data в порядке вставки.
+    """
+    QUERY = 'SELECT * FROM tag_data ORDER BY rowid'
+
+    def __init__(self, path: Path, *, query: str = QUERY):
+        raise_invalid_path(path, DataParserError, exts=('.sqlite', '.db'))
+        self.path = path
+        self.query = query
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA schema_version')
+        except sqlite3.DatabaseError:
+            raise DataParserError(f'Документ "{path}" не является базой данных SQLite.')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f'{self.path.absolute().as_uri()}?mode=ro', uri=True)
+
+    def _rows(self) -> Iterator[tuple]:
+        conn = self._connect()
+        try:
+            yield from map(_normalize_row, conn.execute(self.query))  # ряды читаются курсором по одному
+        except sqlite3.DatabaseError as e:
+            raise DataParserError(f'Ошибка чтения данных из "{self.path}": {e}')
+        finally:
+            conn.close()
+
+
+PARSERS: dict[str, type[RowDataParser]] = {
+    '.xlsx': XlsxDataParser,
+    '.xls': XlsxDataParser,
+    '.csv': CsvDataParser,
+    '.jsonl': JsonDataParser,
+    '.sqlite': SqliteDataParser,
+    '.db': SqliteDataParser,
+}
+
+
+def get_data_parser(path: Path, source: BinaryIO = None) -> RowDataParser:
+    """
+    Возвращает парсер данных, соответствующий расширению документа path.
+
+    :param path: путь до документа с данными.
+    :param source: уже прочитанное содержимое документа, только для парсеров со streamable = True.
+    :return: парсер данных.
+    """
+    if source is None:
+        raise_invalid_path(path, DataParserError, exts=tuple(PARSERS))
+        return PARSERS[path.suffix](path)
+    if not (parser := PARSERS.get(path.suffix)) or not parser.streamable:
+        raise DataParserError(f'Документ "{path}" не может быть прочитан из памяти.')
+    return parser(path, source=source)
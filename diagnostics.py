@@ -0,0 +1,104 @@
+import json
+from collections import Counter
+
+from loguru import logger
+
+
+INFLECT_FAILED = 'inflect_failed'
+UNKNOWN_TAG = 'unknown_tag'
+
+EVENTS = {  # описания событий для текстовой сводки.
+    INFLECT_FAILED: 'Не удалось привести слова к падежу',
+    UNKNOWN_TAG: 'Найдены несуществующие тэги',
+}
+
+
+class Diagnostics:
+    """
+    Сборщик диагностических событий. События не пишутся в лог по одному, а подсчитываются
+    по ключу (слово и падеж, тэг) и выводятся одной сводкой при вызове flush.
+    """
+
+    def __init__(self, level: str = 'WARNING', fmt: str = 'text'):
+        """
+        :param level: минимальный уровень лога событий, события ниже уровня не учитываются.
+        :param fmt: формат сводки: text или json.
+        """
+        self.configure(level, fmt)
+        self._events: dict[str, Counter[str]] = {}  # Маппинг события на колличество появлений каждого ключа.
+        self._levels: dict[str, str] = {}  # Маппинг события на уровень лога.
+
+    def configure(self, level: str = 'WARNING', fmt: str = 'text'):
+        """ Устанавливает уровень и формат сводки. """
+        if fmt not in ('text', 'json'):
+            raise ValueError(f'Неизвестный формат сводки "{fmt}".')
+        self.level = level
+        self.fmt = fmt
+        self._threshold = logger.level(level).no
+
+    def record(self, event: str, key: str, *, level: str = 'WARNING', count: int = 1):
+        """
+        Учитывает событие.
+
+        :param event: имя события.
+        :param key: ключ, по которому события одного имени объединяются.
+        :param level: уровень лога события.
+        :param count: колличество появлений события.
+        :return:
+        """
+        if logger.level(level).no < self._threshold:
+            return
+        if (counter := self._events.get(event)) is None:
+            counter = self._events[event] = Counter()
+            self._levels[event] = level
+        counter[key] += count
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        """ Возвращает колличество появлений каждого ключа каждого события. """
+        return {event: dict(counter.most_common()) for event, counter in self._events.items()}
+
+    def drain(self) -> tuple[dict[str, dict[str, int]], dict[str, str]]:
+        """ Возвращает сводку и уровни лога событий и очищает их, например, для передачи из процесса задания. """
+        summary, levels = self.summary(), dict(self._levels)
+        self.clear()
+        return summary, levels
+
+    def merge(self, summary: dict[str, dict[str, int]], levels: dict[str, str]):
+        """
+        Учитывает события, собранные другим сборщиком (см. drain).
+
+        :param summary: колличество появлений каждого ключа каждого события.
+        :param levels: уровни лога событий.
+        """
+        for event, counts in summary.items():
+            for key, n in counts.items():
+                self.record(event, key, level=levels.get(event, 'WARNING'), count=n)
+
+    def clear(self):
+        self._events.clear()
+        self._levels.clear()
+
+    def flush(self, title: str = None) -> str | None:
+        """
+        Выводит в лог одну сводку по всем учтенным событиям и очищает их.
+
+        :param title: заголовок сводки (например, имя документа).
+        :return: текст сводки или None, если событий не было.
+        """
+        if not self._events:
+            return None
+        if self.fmt == 'json':
+            message = json.dumps({'title': title, 'events': self.summary()}, ensure_ascii=False)
+        else:
+            lines = [f'Диагностика {title}:' if title else 'Диагностика:']
+            for event, counts in self.summary().items():
+                keys = ', '.join(f'"{key}" x{n}' if n > 1 else f'"{key}"' for key, n in counts.items())
+                lines.append(f'{EVENTS.get(event, event)} ({sum(counts.values())}): {keys}')
+            message = '\n'.join(lines)
+        level = max(self._levels.values(), key=lambda name: logger.level(name).no)
+        self.clear()
+        logger.log(level, message)
+        return message
+
+
+diagnostics = Diagnostics()  # Общий сборщик событий процесса.
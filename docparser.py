@@ -1,12 +1,20 @@
+import io
 import re
+from bisect import bisect_right
 from collections import defaultdict
+from itertools import accumulate
 from pathlib import Path
-from loguru import logger
+from typing import BinaryIO
+from lxml import etree
 from docx import Document
 from docx.document import Document as HintDocument
+from docx.oxml.ns import qn
+from docx.oxml.text.paragraph import CT_P
+from docx.oxml.text.run import CT_R
 from docx.shared import Length
 from docx.text.paragraph import Paragraph
-from interfaces import raise_invalid_path, DocxEnumTag
+from diagnostics import diagnostics, UNKNOWN_TAG
+from interfaces import raise_invalid_path, atomic_write, DocxEnumTag
 from morfeus import morf
 
 
@@ -16,31 +24,62 @@ class _DocxTag:
     поставить предложение перед заменой.
     """
 
+    __slots__ = ('enum', 'due')
+    _instances: dict[tuple[str, str | None], '_DocxTag'] = {}  # Общие для всех документов экземпляры тэгов.
+
     def __init__(self, enum: DocxEnumTag, due: str = None):
         self.enum = enum
         self.due = due
-        self.value = enum.value
-        self.name = enum.name
+
+    @property
+    def value(self) -> str:
+        return self.enum.value
+
+    @property
+    def name(self) -> str:
+        return self.enum.name
 
     @staticmethod
     def global_re() -> str:
-        """ Возвращает регулярное выражение для поиска любого тэга в тексте. """
-        return '<(?P<tag>[A-Z_]+)(:(?P<due>[a-z]+))?>'
+        """
+        Возвращает регулярное выражение для поиска любого тэга в тексте. Группа tag совпадает
+        с существующими тэгами, группа unknown - с несуществующими.
+        """
+        # длинные значения раньше коротких, чтобы DIRECTOR_NAME не совпадал как DIRECTOR
+        tags = '|'.join(sorted((e.value for e in DocxEnumTag), key=len, reverse=True))
+        return f'<(?:(?P<tag>{tags})|(?P<unknown>[A-Z_]+))(:(?P<due>[a-z]+))?>'
 
     def local_re(self) -> str:
         """ Возвращает регулярное выражение для поиска тэга в тексте. """
         return f'<(?P<tag>{self.value})(:(?P<due>[a-z]+))?>'
 
-    def replace_re(self) -> str:
-        """ Возвращает регулярное выражение для замены тэга в тексте. """
-        if due := self.due:
-            return f'<{self.value}:{due}>'
-        return f'<{self.value}>'
-
     @classmethod
     def from_re(cls, tag: re.Match) -> '_DocxTag':
-        e = DocxEnumTag(tag.group('tag'))
-        return cls(e, due=tag.group('due'))
+        if tag.group('unknown'):
+            raise ValueError(f'Несуществующий тэг "{tag.group(0)}".')
+        key = (tag.group('tag'), tag.group('due'))
+        if (t := cls._instances.get(key)) is None:  # тэг неизменяем, поэтому экземпляр переиспользуется
+            t = cls._instances[key] = cls(DocxEnumTag(key[0]), due=key[1])
+        return t
+
+
+_TAG_RE = re.compile(_DocxTag.global_re())  # Регулярное выражение для поиска тэгов, общее для всех документов.
+
+
+class _Anchor:
+    """
+    Положение найденного тэга в документе: элемент параграфа, индекс блока (w:r) в параграфе,
+    смещение начала тэга в блоке, длина тэга, тэг и его падеж. Тэг может продолжаться в следующих блоках.
+    """
+    __slots__ = ('element', 'run', 'offset', 'length', 'tag', 'due')
+
+    def __init__(self, element: CT_P, run: int, offset: int, length: int, tag: _DocxTag):
+        self.element = element
+        self.run = run
+        self.offset = offset
+        self.length = length
+        self.tag = tag
+        self.due = tag.due
 
 
 class UnknownDueDate(Exception):
@@ -53,11 +92,18 @@ class TaggedDocError(Exception):
 
 
 class TaggedDoc:
-    def __init__(self, path: Path, init: bool = False):
-        raise_invalid_path(path, TaggedDocError, exts=('.docx',))
+    def __init__(self, path: Path, init: bool = False, normalize: bool = False, *, source: BinaryIO = None):
+        """
+        :param path: путь до шаблона docx.
+        :param init: проанализировать документ на наличие тэгов.
+        :param normalize: объединить блоки с одинаковым форматированием в параграфах с тэгами (см. normalize_runs).
+        :param source: уже прочитанное содержимое шаблона, path в этом случае используется только в сообщениях.
+        """
+        if source is None:
+            raise_invalid_path(path, TaggedDocError, exts=('.docx',))
         self._path = path  # Путь до шаблона docx.
         try:
-            self._d: HintDocument = Document(path)  # Объект библиотеки python-docx.
+            self._d: HintDocument = Document(source or path)  # Объект библиотеки python-docx.
         except ValueError:
             raise TaggedDocError(f'Неподходящий формат документа {path}. Необходим документ в формате docx.')
         except OSError:
@@ -66,35 +112,116 @@ class TaggedDoc:
         # Маппинг найденных enum тэгов на структуры тэгов, хранящие
         # дополнительную информацию об использовании тэга.
         self._found_tags: dict[DocxEnumTag, list[_DocxTag]] = defaultdict(list)
-        #  Маппинг найденных enum тегов на список параграфов, в которых встречаются найденные тэги.
-        self._hit_paragraphs: dict[DocxEnumTag: set[Paragraph]] = defaultdict(set)
+        #  Маппинг найденных enum тегов на список параграфов (в порядке документа), в которых встречаются тэги.
+        self._hit_paragraphs: dict[DocxEnumTag, list[Paragraph]] = defaultdict(list)
+        # Маппинг найденных enum тегов на незамененные вхождения тэгов в порядке документа.
+        self._anchors: dict[DocxEnumTag, list[_Anchor]] = defaultdict(list)
+        # Маппинг параграфов с тэгами на их блоки и незамененные вхождения тэгов.
+        self._runs: dict[CT_P, list[CT_R]] = {}
+        self._element_anchors: dict[CT_P, list[_Anchor]] = defaultdict(list)
+        self.collapsed_runs = 0  # Колличество блоков, объединенных при нормализации.
+        self._parsed = False  # Индекс вхождений тэгов построен.
+        if normalize:
+            self.collapsed_runs = self.normalize_runs()
         if init:
             self.parse()
 
     def parse(self):
         """
-        Анализирует документ на наличие тэгов.
+        Анализирует документ на наличие тэгов и строит индекс их вхождений.
         :return:
         """
+        self._index(diagnose=True)
+
+    def _index(self, diagnose: bool):
+        """
+        Строит индекс вхождений тэгов.
+
+        :param diagnose: учитывать несуществующие тэги в диагностике.
+        """
         self._clear()
-        search_pattern = _DocxTag.global_re()  # Регулярное выражения для поиска тэгов.
+        self._parsed = True
         for p in self._d.paragraphs:
-            if found := re.finditer(search_pattern, p.text):
-                for tag in found:
-                    try:
-                        t = _DocxTag.from_re(tag)  # Создание экземпляра сложного тэга из строки.
-                    except ValueError:
-                        logger.warning(f'Найден несуществующий тэг "{tag.group(0)}" в параграфе "{p.text}".')
-                    else:
-                        self._hit_paragraphs[t.enum].add(p)  # Сопоставление enum и параграфа где найден тэг.
-                        self._found_tags[t.enum].append(t)  # Сопоставление enum и со сложным тэгом.
+            runs = p._p.r_lst
+            texts = [r.text for r in runs]
+            text = ''.join(texts)
+            if '<' not in text:
+                continue
+            ends = list(accumulate(map(len, texts)))  # позиции концов блоков в тексте параграфа
+            for tag in _TAG_RE.finditer(text):
+                try:
+                    t = _DocxTag.from_re(tag)  # Создание экземпляра сложного тэга из строки.
+                except ValueError:
+                    if diagnose:
+                        diagnostics.record(UNKNOWN_TAG, tag.group(0))
+                    continue
+                i = bisect_right(ends, tag.start())  # блок, в котором начинается тэг
+                anchor = _Anchor(p._p, i, tag.start() - (ends[i] - len(texts[i])), len(tag.group(0)), t)
+                self._runs[p._p] = runs
+                self._element_anchors[p._p].append(anchor)
+                self._anchors[t.enum].append(anchor)
+                hit = self._hit_paragraphs[t.enum]
+                if not hit or hit[-1]._p is not p._p:
+                    hit.append(p)  # Сопоставление enum и параграфа где найден тэг.
+                self._found_tags[t.enum].append(t)  # Сопоставление enum и со сложным тэгом.
+
+    def normalize_runs(self) -> int:
+        """
+        Объединяет соседние блоки (w:r) с одинаковым форматированием (w:rPr) в параграфах с тэгами.
+        Word разбивает тэг на несколько блоков, после объединения каждый тэг находится в одном блоке.
+        Если документ уже проанализирован, индекс вхождений тэгов строится заново.
+
+        :return: колличество объединенных блоков.
+        """
+        collapsed = sum(self._normalize_paragraph(p._p) for p in self._d.paragraphs if _TAG_RE.search(p.text))
+        if collapsed and self._parsed:
+            self._index(diagnose=False)  # индекс ссылается на удаленные блоки
+        return collapsed
+
+    @staticmethod
+    def _normalize_paragraph(p: CT_P) -> int:
+        """
+        Объединяет соседние блоки параграфа p, содержащие только текст, с одинаковым форматированием.
+
+        :param p: элемент параграфа.
+        :return: колличество объединенных блоков.
+        """
+        for proof in p.findall(qn('w:proofErr')):  # отметки проверки орфографии разделяют блоки
+            p.remove(proof)
+        collapsed = 0
+        prev_t, prev_rpr = None, None  # последний текст предыдущего блока и его форматирование
+        for child in list(p):
+            texts = child.findall(qn('w:t'))
+            rpr = child.find(qn('w:rPr'))
+            if child.tag != qn('w:r') or not texts or len(texts) + (rpr is not None) != len(child):
+                prev_t = None  # блок с не текстовым содержимым или не блок
+                continue
+            rpr = etree.tostring(rpr) if rpr is not None else b''
+            if prev_t is not None and rpr == prev_rpr:
+                prev_t.text = (prev_t.text or '') + ''.join(t.text or '' for t in texts)
+                prev_t.set(qn('xml:space'), 'preserve')
+                p.remove(child)
+                collapsed += 1
+            else:
+                prev_t, prev_rpr = texts[-1], rpr
+        return collapsed
 
     def _clear(self):
         self._found_tags.clear()
         self._hit_paragraphs.clear()
+        self._anchors.clear()
+        self._runs.clear()
+        self._element_anchors.clear()
 
     def save(self, path: Path):
-        self._d.save(path)
+        """ Сохраняет документ в path атомарно (см. atomic_write). """
+        atomic_write(path, self._d.save)
+
+    def to_bytes(self) -> bytes:
+        """ Возвращает содержимое docx документа. """
+        buf = io.BytesIO()
+        self._d.save(buf)
+        return buf.getvalue()
 
     def get_used_tags(self) -> list[DocxEnumTag]:
         """
@@ -105,35 +232,37 @@ class TaggedDoc:
 
     def replace_tag(self, tag: DocxEnumTag, content: str):
         """ Заменяет все tag внутри документа на content (в соответсвующем падеже) """
-        paragraphs = self._hit_paragraphs[tag]
-        for p in paragraphs:
-            for t in self._found_tags[tag]:
+        anchors = self._anchors.get(tag, ())
+        due_contents: dict[str | None, str] = {}  # content в каждом из падежей тэга склоняется один раз
+        for a in anchors:
+            if a.due not in due_contents:
                 try:
-                    due_content = morf(str(content), t.due).strip()  # приведение content в нужный падеж
+                    due_contents[a.due] = morf(str(content), a.due).strip()  # приведение content в нужный падеж
                 except ValueError:
-                    raise UnknownDueDate(f'Неизвестный падеж в тэге "{t.name}": "{t.due}".')
-                self._replace_text(p, t.replace_re(), due_content)  # замена тэга на content
+                    raise UnknownDueDate(f'Неизвестный падеж в тэге "{a.tag.name}": "{a.due}".')
+        for a in reversed(anchors):  # с конца документа, чтобы не сдвигать еще не замененные вхождения
+            self._replace_anchor(a, due_contents[a.due])  # замена тэга на content
+        self._anchors.pop(tag, None)
 
-    @staticmethod
-    def _replace_text(paragraph: Paragraph, regex: str, replace_str: str):
-        """ Заменяет все вхождения regex на replace_str внутри paragraph """
-        while True:
-            match = re.search(regex, paragraph.text)
-            if not match:
-                break
-            runs = iter(paragraph.runs)  # итератор по блокам параграфа
-            start, end = match.start(), match.end()  # начало и конец совпадения регулярного выражения
-            for run in runs:
-                run_len = len(run.text)
-                if start < run_len:
-                    break
-                start, end = start - run_len, end - run_len
-            run_text = run.text
-            run.text = f'{run_text[:start]}{replace_str}{run_text[end:]}'
-            end -= len(run_text)
-            for run in runs:
-                if end <= 0:
-                    break
-                run_text = run.text
-                run.text = run_text[end:]
-                end -= len(run_text)
+    def _replace_anchor(self, anchor: _Anchor, replace_str: str):
+        """ Заменяет вхождение тэга anchor на replace_str и сдвигает остальные вхождения в том же параграфе. """
+        runs = self._runs[anchor.element]
+        run = runs[anchor.run]
+        run_text = run.text
+        head = min(anchor.length, len(run_text) - anchor.offset)  # часть тэга в первом блоке
+        run.text = f'{run_text[:anchor.offset]}{replace_str}{run_text[anchor.offset + head:]}'
+        cut: dict[int, int] = {}  # колличество символов тэга, удаленных из начала следующих блоков
+        rest, i = anchor.length - head, anchor.run + 1
+        while rest > 0:
+            run_text = runs[i].text
+            cut[i] = min(rest, len(run_text))
+            runs[i].text = run_text[cut[i]:]
+            rest -= cut[i]
+            i += 1
+        others = self._element_anchors[anchor.element]
+        others.remove(anchor)
+        for a in others:
+            if a.run == anchor.run and a.offset > anchor.offset:
+                a.offset += len(replace_str) - head
+            elif a.run in cut:
+                a.offset -= cut[a.run]
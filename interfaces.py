@@ -1,8 +1,15 @@
+import glob
+import os
+import tempfile
 from enum import Enum
-from typing import Iterator, Type, Iterable
+from typing import Iterator, Type, Iterable, BinaryIO, Callable, NamedTuple
 from pathlib import Path
 
 
+_UMASK = os.umask(0)  # Маска прав создаваемых файлов процесса.
+os.umask(_UMASK)
+
+
 def raise_invalid_path(path: Path, throw: Type[Exception], *, exts: Iterable[str] = None):
     """
     Проверяет существует ли путь и является ли путь валидным, иначе поднимает
@@ -23,6 +30,44 @@ def raise_invalid_path(path: Path, throw: Type[Exception], *, exts: Iterable[str
                         f'одном из форматов: [{", ".join(exts)}]')
 
 
+def atomic_write(path: Path, write: Callable[[BinaryIO], object]):
+    """
+    Атомарно записывает файл path: write пишет во временный файл рядом с path, который затем
+    переименовывается в path. Прерванная запись не оставляет неполный файл.
+
+    :param path: путь до файла.
+    :param write: функция записи содержимого в открытый файл.
+    :return:
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp, 0o666 & ~_UMASK)  # mkstemp создает файл с правами 0600
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def remove_stale_writes(path: Path) -> int:
+    """
+    Удаляет временные файлы atomic_write для path, оставшиеся после принудительного завершения процесса.
+    Вызывается только когда запись в path заведомо не выполняется.
+
+    :param path: путь до файла.
+    :return: колличество удаленных файлов.
+    """
+    removed = 0
+    for tmp in path.parent.glob(f'.{glob.escape(path.name)}.*.tmp'):
+        try:
+            tmp.unlink()
+            removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
 class DocxEnumTag(Enum):
     """
     Список доступных тэгов для использования в шаблоне docx
@@ -47,49 +92,92 @@ class Field:
     """
     Поле для сохранения значения.
     """
-    columns: int = 1
-    rows: int = 1
-    owner: DocxEnumTag = None
-    value = None
+    __slots__ = ()
+    columns: int
+    rows: int | None
+    owner: DocxEnumTag
+    value: object
 
     def __call__(self, value: str):
         raise NotImplementedError
 
 
-class LineField(Field):
+class FieldSlot(NamedTuple):
     """
-    Однострочное поле, множественные вызовы перезаписывают значение.
+    Неизменяемое описание поля в схеме данных.
     """
-    def __init__(self, columns: int, owner: DocxEnumTag):
-        """
-        :param columns: Колличество колонок занимаемое значением.
-        :param owner: Тэг владелец значения.
-        """
-        self.columns = columns
-        self.owner = owner
-        self.rows = 1
+    canon: str  # Каноничное имя поля.
+    owner: DocxEnumTag  # Тэг владелец значения.
+    columns: int  # Колличество колонок занимаемое значением.
+    rows: int | None  # Колличество строк занимаемое значением, 1 для однострочного поля, None если неизвестно.
+    index: int  # Индекс значения в массиве значений документа.
 
-    def __call__(self, value: str):
-        self.value = value
 
+class SlotField(Field):
+    """
+    Поле документа: описание поля схемы, связанное с массивом значений документа.
+    Однострочное поле перезаписывает значение, многострочное - дописывает.
+    """
+    __slots__ = ('slot', '_values')
+
+    def __init__(self, slot: FieldSlot, values: list):
+        self.slot = slot
+        self._values = values
+
+    @property
+    def columns(self) -> int:
+        return self.slot.columns
+
+    @property
+    def rows(self) -> int | None:
+        return self.slot.rows
+
+    @property
+    def owner(self) -> DocxEnumTag:
+        return self.slot.owner
+
+    @property
+    def value(self):
+        return self._values[self.slot.index]
 
-class MultiField(Field):
+    def __call__(self, value):
+        if self.slot.rows == 1:
+            self._values[self.slot.index] = value
+        else:
+            self._values[self.slot.index].append(value)
+
+
+class TagSchema:
     """
-    Многострочное поле, множественные вызовы дописывают значение.
+    Неизменяемая схема данных, общая для всех документов: сопоставляет каноничные имена полей
+    и тэги с индексами значений в массиве значений документа.
     """
-    def __init__(self, columns: int, owner: DocxEnumTag, rows: int = None):
+    __slots__ = ('slots', '_by_canon', '_by_tag', '_multi')
+
+    def __init__(self, fields: Iterable[tuple[str, DocxEnumTag, int, int | None]]):
         """
-        :param columns: Колличество колонок занимаемое значением.
-        :param owner: Тэг владелец значения.
-        :param rows: Колличество строк занимаемое значением, если колличество неизвестно, то None.
+        :param fields: Каноничное имя, тэг владелец, колличество колонок и строк каждого поля (см. FieldSlot).
         """
-        self.rows = rows
-        self.columns = columns
-        self.owner = owner
-        self.value: list[list[str]] = []
+        self.slots: tuple[FieldSlot, ...] = tuple(FieldSlot(*field, index=i) for i, field in enumerate(fields))
+        self._by_canon: dict[str, FieldSlot] = {slot.canon: slot for slot in self.slots}
+        self._by_tag: dict[DocxEnumTag, FieldSlot] = {slot.owner: slot for slot in self.slots}
+        self._multi: tuple[int, ...] = tuple(slot.index for slot in self.slots if slot.rows != 1)
+
+    def __len__(self) -> int:
+        return len(self.slots)
 
-    def __call__(self, value: list[str]):
-        self.value.append(value)
+    def by_canon(self, canon: str) -> FieldSlot | None:
+        return self._by_canon.get(canon)
+
+    def by_tag(self, tag: DocxEnumTag) -> FieldSlot | None:
+        return self._by_tag.get(tag)
+
+    def new_values(self) -> list:
+        """ Возвращает массив значений нового документа: None для однострочных полей, [] для многострочных. """
+        values = [None] * len(self.slots)
+        for i in self._multi:
+            values[i] = []
+        return values
 
 
 class UnsetFieldError(Exception):
@@ -100,6 +188,8 @@ class XlsxData:
     """
     Интерфейс доступа к данным xlsx документа.
     """
+    __slots__ = ()
+
     def get_field(self, xlsx_field: str) -> Field | None:
         """
         Возвращает поле, соответствующую строке xlsx_field.
@@ -1,30 +1,44 @@
 import argparse
 import sys
 from pathlib import Path
+from typing import BinaryIO
 
 from docx.shared import Inches
 from docx.text.paragraph import Paragraph
 from loguru import logger
 
+from dataparser import get_data_parser
+from diagnostics import diagnostics
 from docparser import TaggedDoc, UnknownDueDate, TaggedDocError
 from interfaces import XlsxData, UnsetFieldError, DocxEnumTag
-from table import DocxTable
-from xlsxparser import XlsxDataParser, XlsxDataParserError, TagData
+from morfeus import TableBackend, MorphTableError, set_backend
+from table import DocxTable, StyleCache
+from xlsxparser import XlsxDataParserError, TagData
 
 
 VERSION = 1.1
 
 
+TABLES_TAGS = (DocxEnumTag.DIRECTOR, DocxEnumTag.DIRECTOR_NAME, DocxEnumTag.GROUP)  # данные строк таблиц студентов.
+
+
+def required_tags(doc: TaggedDoc) -> set[DocxEnumTag]:
+    """ Возвращает тэги, значения которых необходимы для заполнения шаблона docx. """
+    tags = set(doc.get_used_tags())
+    if DocxEnumTag.TABLES in tags:
+        tags.update(TABLES_TAGS)
+    return tags
+
+
 def check_filled(data: XlsxData, doc: TaggedDoc):
     """ Проверяет, все ли необходимые данные заполнены в xlsx. """
     if unset := data.get_unset_fields():
-        unset_tags = tuple(field[1].owner for field in unset)  # распаковка только enum тэгов.
         used_tags = doc.get_used_tags()  # получение использованных enum тегов в шаблоне docx.
-        for tag in used_tags:
-            if tag in unset_tags:
-                err = "\n".join(field[0] for field in unset)
-                raise UnsetFieldError(f'Недостаточно данных для формирования docx документа, '
-                                      f'следующие поля должны быть установлены: \n{err}')
+        # поля неиспользуемых тэгов не извлекаются из данных, поэтому не считаются ошибкой.
+        if missing := tuple(canon for canon, field in unset if field.owner in used_tags):
+            err = "\n".join(missing)
+            raise UnsetFieldError(f'Недостаточно данных для формирования docx документа, '
+                                  f'следующие поля должны быть установлены: \n{err}')
 
 
 def fill_tables(doc: TaggedDoc, tag: DocxEnumTag, xl_data: XlsxData):
@@ -48,7 +62,7 @@ def fill_tables(doc: TaggedDoc, tag: DocxEnumTag, xl_data: XlsxData):
         n_students += 1
     try:
         table_paragraph = doc._hit_paragraphs[tag].pop()  # параграф, в котором найден тэг таблицы.
-    except KeyError:  # тэг таблиц не использовался в документе
+    except IndexError:  # тэг таблиц не использовался в документе
         return
     paragraph = _new_p(table_paragraph)  # вставка нового неформатированного параграфа.
     table_paragraph._element.getparent().remove(table_paragraph._p)  # удаление параграфа с тэгом.
@@ -57,16 +71,18 @@ def fill_tables(doc: TaggedDoc, tag: DocxEnumTag, xl_data: XlsxData):
     director_name = xl_data.get(DocxEnumTag.DIRECTOR_NAME).value  # фио преподователя
     group = xl_data.get(DocxEnumTag.GROUP).value  # номер группы студентов.
 
+    styles = StyleCache(doc._d.part)  # стили документа ищутся по имени один раз.
     n_students = 1  # нумерация студентов.
     n_org = 1  # нумерация органицаций.
     for table_data in xl_data.get(DocxEnumTag.TABLES).value:  # для каждой группы данных таблицы.
-        table = DocxTable(paragraph, width=doc.width, columns_width=(Inches(5),))  # создание экземпляра таблицы
+        # создание экземпляра таблицы
+        table = DocxTable(paragraph, width=doc.width, columns_width=(Inches(5),), styles=styles)
         table.make_base_headings()  # создание шапки.
 
         name, _ = table_data[0]
         if _ is None:
             paragraph.add_run(f'{n_org}. {name}\n')
-            paragraph.style = 'Heading 4'
+            styles.set_paragraph_style(paragraph, 'Heading 4')
         else:
             _add_student(table_data[0][0], table_data[0][1])  # имя организации опущено, первый кортеж - студент
 
@@ -85,6 +101,40 @@ def fill_tables(doc: TaggedDoc, tag: DocxEnumTag, xl_data: XlsxData):
         table.apply()
 
 
+RENDER_ERRORS = (XlsxDataParserError, TaggedDocError, UnsetFieldError, MorphTableError, UnknownDueDate)
+
+
+def render(docx_path: Path, xlsx_path: Path, out: Path | None, *, normalize: bool = False,
+           docx_source: BinaryIO = None, xlsx_source: BinaryIO = None) -> TaggedDoc:
+    """
+    Заполняет шаблон docx данными и сохраняет новый docx документ.
+
+    :param docx_path: путь до шаблона docx документа.
+    :param xlsx_path: путь до документа с данными.
+    :param out: путь до нового docx документа, если None, то документ не сохраняется.
+    :param normalize: объединить блоки текста с одинаковым форматированием в параграфах шаблона с тэгами.
+    :param docx_source: уже прочитанное содержимое шаблона.
+    :param xlsx_source: уже прочитанное содержимое документа с данными.
+    :return: заполненный документ.
+    :raises: одно из исключений RENDER_ERRORS.
+    """
+    doc = TaggedDoc(docx_path, init=True, normalize=normalize, source=docx_source)
+    if normalize:
+        logger.info(f'Объединено блоков текста в шаблоне: {doc.collapsed_runs}.')
+    xl_data = get_data_parser(xlsx_path, xlsx_source).parse(TagData, required_tags(doc))  # только поля из шаблона
+    check_filled(xl_data, doc)
+
+    for field in xl_data:
+        match field.owner:
+            case DocxEnumTag.TABLES:
+                fill_tables(doc, field.owner, xl_data)
+            case _:
+                doc.replace_tag(field.owner, field.value)
+    if out is not None:
+        doc.save(out)
+    return doc
+
+
 class NoArgsAction(argparse.Action):
     def __init__(self, option_strings, dest, nargs=None, **kwargs):
         super().__init__(option_strings, dest, nargs=0, **kwargs)
@@ -110,8 +160,15 @@ def main():
     parser = argparse.ArgumentParser(description='Программа для заполнения шаблона docx документа с тэгами, согласно '
                                                  'данным из xlsx документа.')
     parser.add_argument('docx', type=str, help='путь до шаблона docx документа.')
-    parser.add_argument('xlsx', type=str, help='путь до xlsx документа с данными.')
+    parser.add_argument('xlsx', type=str, help='путь до документа с данными (xlsx, csv, jsonl или sqlite).')
     parser.add_argument('-o', '--out', type=str, help='путь до нового docx документа.')
+    parser.add_argument('-m', '--morph-table', type=str, help='путь до таблицы склонений (см. morfeus.py).')
+    parser.add_argument('-n', '--normalize', action='store_true',
+                        help='объединить блоки текста с одинаковым форматированием в параграфах шаблона с тэгами.')
+    parser.add_argument('--diagnostics', choices=('text', 'json'), default='text',
+                        help='формат сводки предупреждений по документу.')
+    parser.add_argument('--diagnostics-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default='WARNING',
+                        help='минимальный уровень событий, попадающих в сводку.')
     parser.add_argument('-lt', '--list-tags', action=ListTagsAction, help='отобразить список доступных тэгов.')
     parser.add_argument('-v', '--version', action=ShowVersionAction, help='отобразить версию программы.')
 
@@ -120,28 +177,19 @@ def main():
     docx_path = Path(args.docx)
     out = Path(args.out) if args.out else Path(f'{docx_path.stem}-prepared.docx')
 
+    diagnostics.configure(args.diagnostics_level, args.diagnostics)
     try:
-        xl_data = XlsxDataParser(xlsx_path).parse(TagData)
-        doc = TaggedDoc(docx_path, init=True)
-        check_filled(xl_data, doc)
-    except (XlsxDataParserError, TaggedDocError, UnsetFieldError) as e:
+        if args.morph_table:
+            set_backend(TableBackend(Path(args.morph_table)))
+        render(docx_path, xlsx_path, out, normalize=args.normalize)
+    except RENDER_ERRORS as e:
+        diagnostics.flush(docx_path.as_posix())
         logger.error(e)
         exit(1)
 
-    for field in xl_data:
-        match field.owner:
-            case DocxEnumTag.TABLES:
-                fill_tables(doc, field.owner, xl_data)
-            case _:
-                try:
-                    doc.replace_tag(field.owner, field.value)
-                except UnknownDueDate as e:
-                    logger.error(e)
-                    exit(1)
-
+    diagnostics.flush(docx_path.as_posix())
     logger.info(f'Документ {out.as_posix()} успешно создан по шаблону {docx_path.as_posix()} на '
                 f'основе данных из {xlsx_path.as_posix()}.')
-    doc.save(out)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,156 @@
+import hashlib
+import mmap
 import re
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator
 
 import pymorphy2
 from loguru import logger
 
+from diagnostics import diagnostics, INFLECT_FAILED
 
-_morf = pymorphy2.MorphAnalyzer(lang='ru')
+
+CASES = ('nomn', 'gent', 'datv', 'accs', 'ablt', 'loct')  # падежи, хранимые в таблице склонений.
+
+
+class MorphTableError(Exception):
+    pass
+
+
+class InflectionBackend:
+    """
+    Интерфейс механизма склонения слов.
+    """
+    def inflect(self, word: str, target: str) -> str | None:
+        """
+        Приводит слово к граммеме target.
+
+        :param word: слово.
+        :param target: граммема.
+        :return: слово в нижнем регистре, поставленное в указанный падеж, или None, если изменить слово не удалось.
+        :raises ValueError: неизвестная граммема.
+        """
+        raise NotImplementedError
+
+
+class PymorphyBackend(InflectionBackend):
+    """
+    Склонение слов с помощью pymorphy2. Словари загружаются при первом склонении.
+    """
+    def __init__(self):
+        self._analyzer: pymorphy2.MorphAnalyzer | None = None
+
+    @property
+    def analyzer(self) -> pymorphy2.MorphAnalyzer:
+        if self._analyzer is None:
+            self._analyzer = pymorphy2.MorphAnalyzer(lang='ru')
+        return self._analyzer
+
+    def inflect(self, word: str, target: str) -> str | None:
+        m = self.analyzer.parse(word)[0]
+        inf = m.inflect({target})
+        return inf.word if inf is not None else None
+
+
+class TableBackend(InflectionBackend):
+    """
+    Склонение слов по заранее построенной таблице (см. build_table). Таблица отображается в память
+    и представляет собой хэш-таблицу с открытой адресацией:
+
+    заголовок (MAGIC, колличество ячеек, колличество падежей),
+    ячейки (хэш слова, смещение записи, длина записи),
+    записи (слово и его формы в порядке CASES, разделенные нулевым символом, в utf-8).
+
+    Слова, отсутствующие в таблице, и падежи вне CASES склоняются механизмом fallback.
+    """
+    MAGIC = b'MRF1'
+    HEADER = struct.Struct('<4sII')
+    SLOT = struct.Struct('<QII')
+
+    def __init__(self, path: Path, fallback: InflectionBackend = None):
+        """
+        :param path: путь до таблицы склонений.
+        :param fallback: механизм склонения неизвестных слов, по умолчанию pymorphy2.
+        """
+        try:
+            with path.open('rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self._slots, cases = self.HEADER.unpack_from(self._map)
+        except (OSError, ValueError, struct.error):
+            raise MorphTableError(f'Не удалось открыть таблицу склонений "{path}".')
+        if magic != self.MAGIC or cases != len(CASES):
+            raise MorphTableError(f'Документ "{path}" не является таблицей склонений.')
+        if not self._slots or len(self._map) < self.HEADER.size + self._slots * self.SLOT.size:
+            raise MorphTableError(f'Таблица склонений "{path}" повреждена.')
+        self._fallback = fallback or PymorphyBackend()
+
+    @staticmethod
+    def hash(word: str) -> int:
+        """ Стабильный между процессами хэш слова. """
+        return int.from_bytes(hashlib.blake2b(word.encode('utf8'), digest_size=8).digest(), 'little')
+
+    def _lookup(self, word: str) -> list[str] | None:
+        """ Возвращает формы слова в порядке CASES или None, если слова нет в таблице. """
+        h = self.hash(word)
+        i = h % self._slots
+        for _ in range(self._slots):  # в поврежденной таблице может не быть пустых ячеек
+            slot_hash, offset, length = self.SLOT.unpack_from(self._map, self.HEADER.size + i * self.SLOT.size)
+            if not length:  # пустая ячейка - слова нет в таблице
+                return None
+            if slot_hash == h:
+                record = self._map[offset:offset + length].decode('utf8').split('\0')
+                if record[0] == word:
+                    return record[1:]
+            i = (i + 1) % self._slots
+        return None
+
+    def inflect(self, word: str, target: str) -> str | None:
+        if target in CASES and (forms := self._lookup(word.lower())) is not None:
+            return forms[CASES.index(target)] or None  # пустая форма - слово не склоняется
+        return self._fallback.inflect(word, target)
+
+
+def build_table(phrases: Iterable[str], path: Path, backend: InflectionBackend = None) -> int:
+    """
+    Строит таблицу склонений для TableBackend из всех слов фраз phrases.
+
+    :param phrases: фразы, слова которых необходимо просклонять.
+    :param path: путь для сохранения таблицы.
+    :param backend: механизм склонения для построения таблицы, по умолчанию pymorphy2.
+    :return: колличество слов в таблице.
+    """
+    backend = backend or PymorphyBackend()
+    words = sorted({cleared.lower() for phrase in phrases for cleared, _ in _splitter(phrase)
+                    if not _skip(cleared)})
+    n_slots = max(len(words) * 2, 1)  # половина ячеек остается пустой для быстрого поиска
+    slots = [(0, 0, 0)] * n_slots
+    records = bytearray()
+    offset = TableBackend.HEADER.size + n_slots * TableBackend.SLOT.size
+    for word in words:
+        forms = (backend.inflect(word, case) or '' for case in CASES)
+        record = '\0'.join((word, *forms)).encode('utf8')
+        h = TableBackend.hash(word)
+        i = h % n_slots
+        while slots[i][2]:
+            i = (i + 1) % n_slots
+        slots[i] = (h, offset + len(records), len(record))
+        records += record
+    with path.open('wb') as f:
+        f.write(TableBackend.HEADER.pack(TableBackend.MAGIC, n_slots, len(CASES)))
+        for slot in slots:
+            f.write(TableBackend.SLOT.pack(*slot))
+        f.write(records)
+    return len(words)
+
+
+_backend: InflectionBackend = PymorphyBackend()
+
+
+def set_backend(backend: InflectionBackend):
+    """ Устанавливает механизм склонения слов для morf. """
+    global _backend
+    _backend = backend
 
 
 def morf(text: str, due_date: str | None, s='') -> str:
@@ -27,7 +173,7 @@ def morf(text: str, due_date: str | None, s='') -> str:
     return proper
 
 
-def _splitter(text: str) -> tuple[str, str]:
+def _splitter(text: str) -> Iterator[tuple[str, str]]:
     """
     Разделяет текст на слова.
 
@@ -40,6 +186,11 @@ def _splitter(text: str) -> tuple[str, str]:
         yield part.strip('()'), part
 
 
+def _skip(word: str) -> bool:
+    """ Слова в верхнем регистре и слова длиной меньше 3 символов не склоняются. """
+    return word.isupper() or len(word) < 3
+
+
 def _inflect(word: str, target: str) -> str:
     """
     Приводит слово в нужный падеж.
@@ -50,11 +201,31 @@ def _inflect(word: str, target: str) -> str:
     :param target: граммема.
     :return: слово поставленное в указаннай падеж.
     """
-    if word.isupper() or len(word) < 3:
+    if _skip(word):
         return word
-    m = _morf.parse(word)[0]
-    inf = m.inflect({target})
+    inf = _backend.inflect(word, target)
     if inf is None:
-        logger.warning(f'Не удалось привести слово "{word}" к таргету "{target}".')
+        diagnostics.record(INFLECT_FAILED, f'{word}:{target}')
         return word
-    return inf.word
+    return inf
+
+
+if __name__ == '__main__':
+    import argparse
+    from dataparser import get_data_parser
+    from interfaces import DocxEnumTag
+    from xlsxparser import TagData
+
+    parser = argparse.ArgumentParser(description='Построение таблицы склонений из фраз документов с данными.')
+    parser.add_argument('table', type=str, help='путь для сохранения таблицы склонений.')
+    parser.add_argument('data', type=str, nargs='+', help='пути до документов с данными.')
+    args = parser.parse_args()
+
+    def _phrases() -> Iterator[str]:
+        for data_path in args.data:
+            for field in get_data_parser(Path(data_path)).parse(TagData):
+                if field.owner != DocxEnumTag.TABLES:  # таблицы вставляются без склонения
+                    yield str(field.value)
+
+    n = build_table(_phrases(), Path(args.table))
+    logger.info(f'Таблица склонений {args.table} построена, слов: {n}.')
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from loguru import logger
+
+from batch import Job, BatchError, read_manifest, add_diagnostics_arguments, DONE, FAILED, DOCUMENT
+from dataparser import PARSERS
+from diagnostics import diagnostics
+from interfaces import atomic_write, remove_stale_writes
+import main as cli
+from morfeus import TableBackend, set_backend
+
+
+class Stage:
+    """
+    Учет загрузки стадии конвейера: суммарное время работы всех исполнителей стадии.
+    """
+    def __init__(self, name: str, concurrency: int):
+        """
+        :param name: имя стадии.
+        :param concurrency: колличество исполнителей стадии.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.busy = 0.0  # Суммарное время работы исполнителей в секундах.
+        self.items = 0  # Колличество обработанных заданий.
+
+    async def run(self, coro):
+        """ Выполняет coro, учитывая время выполнения как время работы стадии. """
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.busy += time.perf_counter() - started
+            self.items += 1
+
+    def utilization(self, wall: float) -> float:
+        """ Доля времени wall, в течение которого исполнители стадии были заняты. """
+        return self.busy / (wall * self.concurrency) if wall else 0.0
+
+
+def _read(job: Job) -> tuple[bytes, bytes | None]:
+    """ Читает шаблон и данные задания. Данные, которые нельзя прочитать из памяти (sqlite), не читаются. """
+    data_parser = PARSERS.get(job.data.suffix)
+    return job.docx.read_bytes(), job.data.read_bytes() if data_parser and data_parser.streamable else None
+
+
+def _write(job: Job, out: bytes):
+    """ Атомарно записывает новый документ задания. """
+    job.out.parent.mkdir(parents=True, exist_ok=True)
+    remove_stale_writes(job.out)  # остались от прерванного запуска конвейера
+    atomic_write(job.out, lambda f: f.write(out))
+
+
+def _init_worker(morph_table: Path | None):
+    if morph_table:
+        set_backend(TableBackend(morph_table))
+
+
+def _render(job: Job, docx: bytes, data: bytes | None, normalize: bool) -> tuple[bytes | None, str | None, dict, dict]:
+    """
+    Заполняет шаблон задания в процессе исполнителя.
+
+    :return: содержимое нового документа или None, текст ошибки или None, события диагностики задания
+    (см. Diagnostics.drain).
+    """
+    out = error = None
+    try:
+        doc = cli.render(job.docx, job.data, None, normalize=normalize, docx_source=io.BytesIO(docx),
+                         xlsx_source=io.BytesIO(data) if data is not None else None)
+        out = doc.to_bytes()
+    except Exception as e:  # ошибка любого документа не должна останавливать конвейер
+        error = f'{type(e).__name__}: {e}'
+    return out, error, *diagnostics.drain()
+
+
+async def run_pipeline(jobs: list[Job], *, readers: int = 2, workers: int = None, writers: int = 2,
+                       read_depth: int = 8, write_depth: int = 8, normalize: bool = False,
+                       morph_table: Path = None, diagnostics_scope: str = DOCUMENT
+                       ) -> tuple[Counter[str], list[Stage], float]:
+    """
+    Выполняет задания конвейером из трех стадий: чтение входных документов, заполнение шаблонов
+    в пуле процессов и запись новых документов. Стадии связаны очередями ограниченной длины, поэтому
+    чтение и запись выполняются одновременно с заполнением, не накапливая документы в памяти.
+
+    :param jobs: задания.
+    :param readers: колличество одновременных чтений.
+    :param workers: колличество процессов заполнения, по умолчанию по числу процессоров.
+    :param writers: колличество одновременных записей.
+    :param read_depth: длина очереди прочитанных заданий.
+    :param write_depth: длина очереди заполненных документов.
+    :param normalize: объединить блоки текста в шаблонах (см. TaggedDoc.normalize_runs).
+    :param morph_table: путь до таблицы склонений.
+    :param diagnostics_scope: выводить сводку диагностики по каждому документу (document) или по пакету (batch).
+    :return: колличество заданий по статусам, стадии и общее время работы в секундах.
+    """
+    workers = workers or os.cpu_count() or 1
+    read, render, write = Stage('чтение', readers), Stage('заполнение', workers), Stage('запись', writers)
+    read_q: asyncio.Queue = asyncio.Queue(read_depth)
+    write_q: asyncio.Queue = asyncio.Queue(write_depth)
+    stats: Counter[str] = Counter()
+    pending = iter(jobs)  # общий для всех читателей итератор заданий
+    loop = asyncio.get_running_loop()
+
+    def fail(job: Job, error: str):
+        stats[FAILED] += 1
+        logger.error(f'Задание {job.id}: {error}')
+
+    async def reader():
+        for job in pending:
+            try:
+                payload = await read.run(asyncio.to_thread(_read, job))
+            except OSError as e:
+                fail(job, f'{type(e).__name__}: {e}')
+            else:
+                await read_q.put((job, payload))
+
+    def new_pool(n: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(n, initializer=_init_worker, initargs=(morph_table,))
+
+    pool = new_pool(workers)
+
+    async def run_isolated(job: Job, docx: bytes, data: bytes | None):
+        """ Повторяет задание в отдельном процессе: аварийное завершение процесса указывает на само задание. """
+        isolated = new_pool(1)
+        try:
+            return await loop.run_in_executor(isolated, _render, job, docx, data, normalize)
+        finally:
+            isolated.shutdown(wait=False)
+
+    async def renderer():
+        nonlocal pool
+        while (item := await read_q.get()) is not None:
+            job, (docx, data) = item
+            used = pool
+            try:
+                out, error, summary, levels = await render.run(
+                    loop.run_in_executor(used, _render, job, docx, data, normalize))
+            except BrokenProcessPool:
+                # Аварийно завершился один из процессов пула, задания остальных процессов прерваны вместе с ним.
+                # Пул пересоздается один раз, а каждое прерванное задание повторяется отдельно.
+                if pool is used:
+                    pool = new_pool(workers)
+                    used.shutdown(wait=False)
+                try:
+                    out, error, summary, levels = await render.run(run_isolated(job, docx, data))
+                except BrokenProcessPool:
+                    fail(job, 'процесс заполнения завершился аварийно')
+                    continue
+            diagnostics.merge(summary, levels)
+            if diagnostics_scope == DOCUMENT:
+                diagnostics.flush(job.id)
+            if error is not None:
+                fail(job, error)
+            else:
+                await write_q.put((job, out))
+
+    async def writer():
+        while (item := await write_q.get()) is not None:
+            job, out = item
+            try:
+                await write.run(asyncio.to_thread(_write, job, out))
+            except OSError as e:
+                fail(job, f'{type(e).__name__}: {e}')
+            else:
+                stats[DONE] += 1
+
+    started = time.perf_counter()
+    try:
+        write_tasks = [asyncio.create_task(writer()) for _ in range(writers)]
+        render_tasks = [asyncio.create_task(renderer()) for _ in range(workers)]
+        await asyncio.gather(*(reader() for _ in range(readers)))
+        for _ in render_tasks:  # завершение стадий по очереди: None - признак конца очереди
+            await read_q.put(None)
+        await asyncio.gather(*render_tasks)
+        for _ in write_tasks:
+            await write_q.put(None)
+        await asyncio.gather(*write_tasks)
+    finally:
+        pool.shutdown()
+    diagnostics.flush()
+    return stats, [read, render, write], time.perf_counter() - started
+
+
+def main():
+    logger.remove()
+    logger.add(sys.stdout, colorize=True, format="<level>{level}</level> | <level>{message}</level>")
+    parser = argparse.ArgumentParser(description='Конвейерное заполнение шаблонов docx: чтение и запись документов '
+                                                 'выполняются одновременно с заполнением.')
+    parser.add_argument('manifest', type=str, help='путь до манифеста заданий (json lines: docx, data, out).')
+    parser.add_argument('--readers', type=int, default=2, help='колличество одновременных чтений.')
+    parser.add_argument('-j', '--workers', type=int, help='колличество процессов заполнения.')
+    parser.add_argument('--writers', type=int, default=2, help='колличество одновременных записей.')
+    parser.add_argument('--read-depth', type=int, default=8, help='длина очереди прочитанных заданий.')
+    parser.add_argument('--write-depth', type=int, default=8, help='длина очереди заполненных документов.')
+    parser.add_argument('-m', '--morph-table', type=str, help='путь до таблицы склонений (см. morfeus.py).')
+    parser.add_argument('-n', '--normalize', action='store_true',
+                        help='объединить блоки текста с одинаковым форматированием в параграфах шаблонов с тэгами.')
+    add_diagnostics_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        jobs = read_manifest(Path(args.manifest))
+    except BatchError as e:
+        logger.error(e)
+        exit(1)
+    diagnostics.configure(args.diagnostics_level, args.diagnostics)
+    stats, stages, wall = asyncio.run(run_pipeline(
+        jobs, readers=args.readers, workers=args.workers, writers=args.writers, read_depth=args.read_depth,
+        write_depth=args.write_depth, normalize=args.normalize,
+        morph_table=Path(args.morph_table) if args.morph_table else None, diagnostics_scope=args.diagnostics_scope))
+    for stage in stages:
+        logger.info(f'Стадия "{stage.name}": заданий {stage.items}, исполнителей {stage.concurrency}, '
+                    f'загрузка {stage.utilization(wall):.0%}.')
+    logger.info(f'Выполнено: {stats[DONE]}, с ошибкой: {stats[FAILED]} за {wall:.1f} с.')
+    if stats[FAILED]:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
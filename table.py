@@ -1,18 +1,66 @@
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml import CT_Tbl
+from docx.parts.document import DocumentPart
 from docx.shared import Length, Inches
 from docx.table import Table
 from docx.text.paragraph import Paragraph
 
 
+class StyleCache:
+    """
+    Кэш идентификаторов стилей документа. Каждое имя стиля ищется в styles.xml один раз,
+    далее идентификатор записывается в w:pStyle/w:tblStyle/w:rStyle напрямую.
+    """
+
+    def __init__(self, part: DocumentPart):
+        """
+        :param part: часть документа, в которой определены стили.
+        """
+        self._part = part
+        self._ids: dict[tuple[str | None, WD_STYLE_TYPE], str | None] = {}
+
+    def get_id(self, name: str | None, style_type: WD_STYLE_TYPE) -> str | None:
+        """
+        Возвращает идентификатор стиля с именем name, None для стиля по умолчанию.
+
+        :param name: имя стиля.
+        :param style_type: тип стиля.
+        :return:
+        """
+        key = (name, style_type)
+        try:
+            return self._ids[key]
+        except KeyError:
+            style_id = self._ids[key] = self._part.get_style_id(name, style_type)
+            return style_id
+
+    def set_paragraph_style(self, p: Paragraph, name: str | None):
+        """ Устанавливает стиль параграфа, аналог p.style = name. """
+        p._p.style = self.get_id(name, WD_STYLE_TYPE.PARAGRAPH)
+
+    def set_table_style(self, table: Table, name: str | None):
+        """ Устанавливает стиль таблицы, аналог table.style = name. """
+        table._tbl.tblStyle_val = self.get_id(name, WD_STYLE_TYPE.TABLE)
+
+
 class DocxTable:
     """ Таблица для docx документа. """
 
     def __init__(self, p: Paragraph, rows: int = 1, cols: int = 4, *, width: Length,
-                 columns_width: tuple[Inches, ...] = None):
+                 columns_width: tuple[Inches, ...] = None, styles: StyleCache = None):
+        """
+        :param p: параграф, после которого вставляется таблица.
+        :param rows: колличество рядов.
+        :param cols: колличество колонок.
+        :param width: ширина таблицы.
+        :param columns_width: ширина колонок, слева направо.
+        :param styles: кэш стилей документа, общий для всех таблиц документа.
+        """
+        self.styles = styles or StyleCache(p.part)
         self.table = self._make_table(rows, cols, width, p)  # создание экземпляра таблицы.
         # добавление стилей в таблицу.
-        self.table.style = 'Table Grid'
+        self.styles.set_table_style(self.table, 'Table Grid')
         self.table.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
         self.last_row = self.table.rows[0]
@@ -57,11 +105,13 @@ class DocxTable:
             if content:
                 p = cell.paragraphs[0]
 
-                p.style = p_style  # применение стилей.
+                self.styles.set_paragraph_style(p, p_style)  # применение стилей.
                 if align:
                     p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
-                p.add_run(content, style=char_style)  # добавление текста в параграф.
+                r = p.add_run(content)  # добавление текста в параграф.
+                if char_style:
+                    r._r.style = self.styles.get_id(char_style, WD_STYLE_TYPE.CHARACTER)
         self.last_row = None
         return self.rows
 
@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+from pathlib import Path
+from loguru import logger
+import batch
+from batch import Job, Journal, BatchError, read_manifest, run_batch, DONE, FAILED, DOCUMENT, BATCH
+from tests.test_docx import DOCX_RESOURCE, DOCX_RESOURCE_BAD
+from diagnostics import diagnostics, INFLECT_FAILED
+from interfaces import atomic_write
+from tests.test_xlsx import XLSX_RESOURCE, XLSX_RESOURCE_BAD
+
+
+@pytest.fixture()
+def manifest(tmp_path):
+    path = tmp_path / 'manifest.jsonl'
+    jobs = ({'docx': DOCX_RESOURCE.as_posix(), 'data': XLSX_RESOURCE.as_posix(),
+             'out': (tmp_path / '1.docx').as_posix()},
+            {'docx': DOCX_RESOURCE_BAD.as_posix(), 'data': XLSX_RESOURCE_BAD.as_posix(),
+             'out': (tmp_path / '2.docx').as_posix()})
+    path.write_text('\n'.join(json.dumps(job) for job in jobs), encoding='utf8')
+    return path
+
+
+def test_batch_resume(manifest, tmp_path):
+    jobs = read_manifest(manifest)
+    journal = Journal(tmp_path / 'journal.jsonl')
+    stats = run_batch(jobs, journal, workers=2, retries=1, timeout=60)
+    assert stats[DONE] == 1 and stats[FAILED] == 1
+    assert jobs[0].out.exists() and not jobs[1].out.exists()
+    assert not list(tmp_path.glob('*.tmp'))
+
+    records = [json.loads(line) for line in journal.path.read_text(encoding='utf8').splitlines()]
+    assert [r['status'] for r in records].count(FAILED) == 2  # попытка и один повтор
+
+    journal = Journal(journal.path)
+    stats = run_batch(jobs, journal, retries=1)
+    assert stats['skipped'] == 1 and stats[FAILED] == 1 and stats[DONE] == 0
+    assert journal.is_done(jobs[0], jobs[0].input_hash())
+
+
+def test_timeout_retry(manifest, tmp_path, monkeypatch):
+    def hang(docx, data, out, **kwargs):  # зависает посреди записи нового документа
+        atomic_write(out, lambda f: time.sleep(60))
+
+    job = read_manifest(manifest)[0]
+    journal = Journal(tmp_path / 'journal.jsonl')
+    monkeypatch.setattr(batch.cli, 'render', hang)  # процессы заданий создаются через fork
+    stats = run_batch([job], journal, retries=1, timeout=0.5)
+    assert stats[FAILED] == 1
+    records = [json.loads(line) for line in journal.path.read_text(encoding='utf8').splitlines()]
+    assert [r['status'] for r in records] == [FAILED, FAILED]  # попытка и один повтор
+    assert all('превышено время' in r['error'] for r in records)
+    assert len(list(tmp_path.glob('.1.docx.*.tmp'))) == 1  # временный файл первой попытки удален перед повтором
+
+    monkeypatch.undo()
+    stats = run_batch([job], journal, retries=2)
+    assert stats[DONE] == 1 and job.out.exists()
+    assert not list(tmp_path.glob('.1.docx.*.tmp'))
+
+
+@pytest.mark.skipif(batch.resource is None or not sys.platform.startswith('linux'), reason='RLIMIT_AS, /proc')
+def test_memory_limit(manifest, tmp_path, monkeypatch):
+    def hungry(docx, data, out, **kwargs):
+        bytearray(1 << 30)
+
+    with open('/proc/self/statm') as f:  # текущий размер адресного пространства, дочерний процесс его наследует
+        size = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    job = read_manifest(manifest)[0]
+    journal = Journal(tmp_path / 'journal.jsonl')
+    monkeypatch.setattr(batch.cli, 'render', hungry)
+    stats = run_batch([job], journal, retries=0, memory=size // 2 ** 20 + 256)
+    assert stats[FAILED] == 1
+    record = json.loads(journal.path.read_text(encoding='utf8'))
+    assert record['status'] == FAILED and record['error'].startswith('MemoryError')
+
+
+def test_large_diagnostics(tmp_path, monkeypatch):
+    def noisy(docx, data, out, **kwargs):  # сводка больше буфера канала
+        for i in range(20000):
+            diagnostics.record(INFLECT_FAILED, f'слово{i}:gent')
+        out.write_bytes(b'')
+
+    job = Job(DOCX_RESOURCE, XLSX_RESOURCE, tmp_path / '1.docx')
+    monkeypatch.setattr(batch.cli, 'render', noisy)
+    try:
+        stats = run_batch([job], Journal(tmp_path / 'journal.jsonl'), timeout=30, diagnostics_scope=BATCH)
+        assert stats[DONE] == 1
+    finally:
+        diagnostics.clear()
+
+
+@pytest.mark.parametrize('scope', (DOCUMENT, BATCH))
+def test_diagnostics_scope(scope, tmp_path):
+    jobs = [Job(DOCX_RESOURCE_BAD, XLSX_RESOURCE, tmp_path / f'{i}.docx') for i in range(2)]
+    messages = []
+    sink = logger.add(messages.append, level='WARNING', format='{message}')
+    try:
+        run_batch(jobs, Journal(tmp_path / 'journal.jsonl'), workers=2, retries=0, diagnostics_scope=scope)
+    finally:
+        logger.remove(sink)
+    summaries = [m for m in messages if 'FACULTYYYY' in m]
+    if scope == DOCUMENT:
+        assert len(summaries) == 2 and all('x2' not in m for m in summaries)
+    else:
+        assert len(summaries) == 1 and '"<FACULTYYYY>" x2' in summaries[0]
+
+
+def test_journal_input_change(manifest, tmp_path):
+    job = read_manifest(manifest)[0]
+    journal = Journal(tmp_path / 'journal.jsonl')
+    journal.write(job, 'other hash', DONE)
+    job.out.write_bytes(b'')
+    assert not journal.is_done(job, job.input_hash())
+    assert journal.is_done(job, 'other hash')
+
+
+def test_bad_manifest(tmp_path):
+    with pytest.raises(BatchError):
+        read_manifest(Path('does not exist'))
+    bad = tmp_path / 'bad.jsonl'
+    bad.write_text('{"docx": "a.docx"}', encoding='utf8')
+    with pytest.raises(BatchError):
+        read_manifest(bad)
+    job = Job(Path('a.docx'), Path('a.xlsx'), Path('out.docx'))
+    assert job.id == 'out.docx'
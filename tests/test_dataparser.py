@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+import sqlite3
+
+import openpyxl
+import pytest
+from pathlib import Path
+from dataparser import CsvDataParser, JsonDataParser, SqliteDataParser, DataParserError, get_data_parser
+from interfaces import DocxEnumTag
+from xlsxparser import XlsxDataParser, TagData
+from tests.test_xlsx import XLSX_RESOURCE
+
+
+def xlsx_rows() -> list[tuple]:
+    return list(openpyxl.load_workbook(XLSX_RESOURCE).active.iter_rows(values_only=True))
+
+
+@pytest.fixture()
+def csv_resource(tmp_path):
+    path = tmp_path / 'data.csv'
+    with path.open('w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(('' if v is None else v for v in row) for row in xlsx_rows())
+    return path
+
+
+@pytest.fixture()
+def jsonl_resource(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    path.write_text('\n'.join(json.dumps(row, ensure_ascii=False) for row in xlsx_rows()), encoding='utf-8')
+    return path
+
+
+@pytest.fixture()
+def sqlite_resource(tmp_path):
+    path = tmp_path / 'data.sqlite'
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE tag_data (key TEXT, v1, v2, v3)')
+        conn.executemany('INSERT INTO tag_data VALUES (?, ?, ?, ?)', xlsx_rows())
+    return path
+
+
+def assert_same_data(data: TagData):
+    expected = XlsxDataParser(XLSX_RESOURCE).parse(TagData)
+    assert len(data.get_unset_fields()) == 0
+    for field in expected:
+        value = data.get(field.owner).value
+        if field.owner == DocxEnumTag.TABLES:
+            assert value == field.value
+        else:
+            assert str(value) == str(field.value)
+
+
+def test_csv(csv_resource):
+    assert_same_data(CsvDataParser(csv_resource).parse(TagData))
+
+
+def test_jsonl(jsonl_resource):
+    assert_same_data(JsonDataParser(jsonl_resource).parse(TagData))
+
+
+def test_sqlite(sqlite_resource):
+    assert_same_data(SqliteDataParser(sqlite_resource).parse(TagData))
+
+
+def test_get_data_parser(csv_resource, jsonl_resource, sqlite_resource):
+    assert isinstance(get_data_parser(csv_resource), CsvDataParser)
+    assert isinstance(get_data_parser(jsonl_resource), JsonDataParser)
+    assert isinstance(get_data_parser(sqlite_resource), SqliteDataParser)
+    assert isinstance(get_data_parser(XLSX_RESOURCE), XlsxDataParser)
+
+
+def test_stream_source(csv_resource, jsonl_resource, sqlite_resource):
+    for path in (csv_resource, jsonl_resource, XLSX_RESOURCE):
+        assert_same_data(get_data_parser(path, io.BytesIO(path.read_bytes())).parse(TagData))
+    with pytest.raises(DataParserError):
+        get_data_parser(sqlite_resource, io.BytesIO(sqlite_resource.read_bytes()))
+
+
+def test_corrupt_data(tmp_path):
+    with pytest.raises(DataParserError):
+        get_data_parser(Path('does not exist'))
+    bad = tmp_path / 'bad.sqlite'
+    bad.write_text('not a database')
+    with pytest.raises(DataParserError):
+        get_data_parser(bad)
+    bad = tmp_path / 'bad.jsonl'
+    bad.write_text('{"key": "value"}')
+    with pytest.raises(DataParserError):
+        get_data_parser(bad).parse(TagData)
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from diagnostics import Diagnostics, diagnostics, UNKNOWN_TAG, INFLECT_FAILED
+from docparser import TaggedDoc
+from tests.test_docx import DOCX_RESOURCE_BAD
+
+
+def test_summary():
+    d = Diagnostics()
+    for _ in range(3):
+        d.record(INFLECT_FAILED, 'слово:gent')
+    d.record(INFLECT_FAILED, 'слово:datv')
+    d.record(UNKNOWN_TAG, '<FOO>')
+    assert d.summary() == {INFLECT_FAILED: {'слово:gent': 3, 'слово:datv': 1}, UNKNOWN_TAG: {'<FOO>': 1}}
+
+    text = d.flush('doc.docx')
+    assert text.count('слово:gent') == 1
+    assert 'x3' in text
+    assert d.flush() is None
+
+
+def test_json_and_level():
+    d = Diagnostics(level='WARNING', fmt='json')
+    d.record(UNKNOWN_TAG, '<FOO>', level='INFO')
+    assert d.flush() is None
+    d.record(UNKNOWN_TAG, '<FOO>')
+    assert json.loads(d.flush('doc.docx')) == {'title': 'doc.docx', 'events': {UNKNOWN_TAG: {'<FOO>': 1}}}
+    with pytest.raises(ValueError):
+        d.configure(fmt='xml')
+
+
+def test_drain_merge():
+    worker, parent = Diagnostics(), Diagnostics()
+    worker.record(UNKNOWN_TAG, '<FOO>', count=2)
+    parent.record(UNKNOWN_TAG, '<FOO>')
+    parent.merge(*worker.drain())
+    assert worker.summary() == {}
+    assert parent.summary() == {UNKNOWN_TAG: {'<FOO>': 3}}
+
+    parent = Diagnostics(level='ERROR')
+    parent.merge({UNKNOWN_TAG: {'<FOO>': 1}}, {UNKNOWN_TAG: 'WARNING'})
+    assert parent.summary() == {}
+
+
+def test_unknown_tags():
+    diagnostics.clear()
+    TaggedDoc(DOCX_RESOURCE_BAD, init=True)
+    TaggedDoc(DOCX_RESOURCE_BAD, init=True)
+    assert diagnostics.summary()[UNKNOWN_TAG] == {'<FACULTYYYY>': 2}
+    diagnostics.clear()
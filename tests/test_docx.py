@@ -60,3 +60,45 @@ def test_corrupt_file():
     with pytest.raises(TaggedDocError):
         TaggedDoc(Path('does not exist'), init=True)
         TaggedDoc(DOCX_RESOURCE_CORRUPT, init=True)
+
+
+def test_normalize_runs(save_path):
+    doc = TaggedDoc(DOCX_RESOURCE, init=True)
+    normalized = TaggedDoc(DOCX_RESOURCE, init=True, normalize=True)
+    assert normalized.collapsed_runs > 0
+    assert [p.text for p in doc._d.paragraphs] == [p.text for p in normalized._d.paragraphs]
+    assert normalized.get_used_tags() == doc.get_used_tags()
+    assert sum(len(p.runs) for p in normalized._d.paragraphs) == \
+           sum(len(p.runs) for p in doc._d.paragraphs) - normalized.collapsed_runs
+    assert normalized.normalize_runs() == 0
+
+    content = "SoMeStRangeString"
+    normalized.replace_tag(DocxEnumTag.GRADE, content)
+    normalized.save(save_path)
+    assert flat_docx(save_path).find(content) != -1
+
+
+def test_normalize_after_parse(save_path):
+    doc = TaggedDoc(DOCX_RESOURCE, init=True)
+    assert doc.normalize_runs() > 0
+    doc.replace_tag(DocxEnumTag.GRADE, 'XYZ')
+    doc.save(save_path)
+    text = '\n'.join(p.text for p in docx.Document(save_path).paragraphs)
+    assert '<GRADE>' not in text and 'XYZ' in text
+
+
+def test_replace_split_tags(tmp_path):
+    path = tmp_path / 'split.docx'
+    d = docx.Document()
+    p = d.add_paragraph()
+    for text in ('Курс <GR', 'A', 'DE>, <GROUP> и <GRA', 'DE> (<KIND>)'):
+        p.add_run(text)
+    d.add_paragraph('<GROUP><GROUP>')
+    d.save(path)
+
+    doc = TaggedDoc(path, init=True)
+    doc.replace_tag(DocxEnumTag.GRADE, '2')
+    doc.replace_tag(DocxEnumTag.KIND, 'учебная')
+    doc.replace_tag(DocxEnumTag.GROUP, 'ИТси-210')
+    doc.replace_tag(DocxEnumTag.GROUP, 'повторно')
+    assert [p.text for p in doc._d.paragraphs] == ['Курс 2, ИТси-210 и 2 (учебная)', 'ИТси-210ИТси-210']
@@ -0,0 +1,69 @@
+import pytest
+from pathlib import Path
+from morfeus import TableBackend, PymorphyBackend, MorphTableError, CASES, build_table, morf, set_backend
+
+PHRASES = ('учебная практика', 'Факультет (МФ)', 'кафедра «Мехатроника»', 'Дмитриев Н.В')
+
+
+class CountingBackend(PymorphyBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def inflect(self, word: str, target: str) -> str | None:
+        self.calls += 1
+        return super().inflect(word, target)
+
+
+@pytest.fixture()
+def table_path(tmp_path):
+    path = tmp_path / 'table.mrf'
+    build_table(PHRASES, path)
+    return path
+
+
+def test_table_matches_pymorphy(table_path):
+    table = TableBackend(table_path, fallback=CountingBackend())
+    pymorphy = PymorphyBackend()
+    for word in ('учебная', 'практика', 'факультет', 'кафедра', 'Дмитриев'):
+        for case in CASES:
+            assert table.inflect(word, case) == pymorphy.inflect(word, case)
+    assert table._fallback.calls == 0
+
+
+def test_table_fallback(table_path):
+    fallback = CountingBackend()
+    table = TableBackend(table_path, fallback=fallback)
+    assert table.inflect('институт', 'gent') == 'института'
+    assert table.inflect('практика', 'plur') == 'практики'
+    assert fallback.calls == 2
+    with pytest.raises(ValueError):
+        table.inflect('практика', 'foo')
+
+
+def test_morf_with_table(table_path):
+    try:
+        set_backend(TableBackend(table_path))
+        assert morf('учебная практика', 'gent').strip() == 'учебной практики'
+    finally:
+        set_backend(PymorphyBackend())
+
+
+def test_corrupt_table(table_path, tmp_path):
+    with pytest.raises(MorphTableError):
+        TableBackend(Path('does not exist'))
+    bad = tmp_path / 'bad.mrf'
+    bad.write_bytes(b'not a table')
+    with pytest.raises(MorphTableError):
+        TableBackend(bad)
+    bad.write_bytes(TableBackend.HEADER.pack(TableBackend.MAGIC, 0, len(CASES)))
+    with pytest.raises(MorphTableError):
+        TableBackend(bad)
+    bad.write_bytes(table_path.read_bytes()[:TableBackend.HEADER.size + TableBackend.SLOT.size])
+    with pytest.raises(MorphTableError):
+        TableBackend(bad)
+    record = b'\0'.join((b'x', *(b'x' for _ in CASES)))
+    offset = TableBackend.HEADER.size + TableBackend.SLOT.size
+    bad.write_bytes(TableBackend.HEADER.pack(TableBackend.MAGIC, 1, len(CASES)) +
+                    TableBackend.SLOT.pack(1, offset, len(record)) + record)
+    assert TableBackend(bad, fallback=CountingBackend()).inflect('практика', 'gent') == 'практики'
@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+from loguru import logger
+import pipeline
+from main import render
+from batch import Job, DONE, FAILED, BATCH
+from pipeline import run_pipeline
+from tests.test_docx import DOCX_RESOURCE, DOCX_RESOURCE_BAD
+from tests.test_xlsx import XLSX_RESOURCE, XLSX_RESOURCE_BAD
+
+
+def test_pipeline(tmp_path):
+    jobs = [Job(DOCX_RESOURCE, XLSX_RESOURCE, tmp_path / f'{i}.docx') for i in range(3)]
+    jobs.append(Job(DOCX_RESOURCE_BAD, XLSX_RESOURCE_BAD, tmp_path / 'bad.docx'))
+    jobs.append(Job(DOCX_RESOURCE, tmp_path / 'missing.xlsx', tmp_path / 'missing.docx'))
+    stats, stages, wall = asyncio.run(run_pipeline(jobs, readers=2, workers=2, writers=1, read_depth=1,
+                                                   write_depth=1))
+    assert stats[DONE] == 3 and stats[FAILED] == 2
+    assert all(job.out.exists() for job in jobs[:3]) and not (tmp_path / 'bad.docx').exists()
+    assert not list(tmp_path.glob('*.tmp'))
+    read, render, write = stages
+    assert (read.items, render.items, write.items) == (5, 4, 3)
+    assert all(0 <= stage.utilization(wall) <= 1 for stage in stages)
+
+
+def test_pipeline_diagnostics(tmp_path):
+    jobs = [Job(DOCX_RESOURCE_BAD, XLSX_RESOURCE, tmp_path / f'{i}.docx') for i in range(3)]
+    messages = []
+    sink = logger.add(messages.append, level='WARNING', format='{message}')
+    try:
+        asyncio.run(run_pipeline(jobs, workers=2, diagnostics_scope=BATCH))
+    finally:
+        logger.remove(sink)
+    summaries = [m for m in messages if 'FACULTYYYY' in m]
+    assert len(summaries) == 1 and '"<FACULTYYYY>" x3' in summaries[0]
+
+
+def crash_on_bad(docx, data, out, **kwargs):
+    if docx == DOCX_RESOURCE_BAD:
+        os._exit(137)  # аварийное завершение процесса пула
+    return render(docx, data, out, **kwargs)
+
+
+def test_pipeline_worker_crash(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.cli, 'render', crash_on_bad)  # процессы пула создаются через fork
+    jobs = [Job(DOCX_RESOURCE, XLSX_RESOURCE, tmp_path / f'{i}.docx') for i in range(6)]
+    jobs.insert(2, Job(DOCX_RESOURCE_BAD, XLSX_RESOURCE, tmp_path / 'crash.docx'))
+    stats, *_ = asyncio.run(run_pipeline(jobs, workers=3))
+    assert stats[DONE] == 6 and stats[FAILED] == 1
+    assert not (tmp_path / 'crash.docx').exists()
@@ -0,0 +1,24 @@
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+
+from table import DocxTable, StyleCache
+
+
+def test_style_cache():
+    doc = Document()
+    styles = StyleCache(doc.part)
+    p1, p2 = doc.add_paragraph(), doc.add_paragraph()
+    p1.style = 'Heading 4'
+    styles.set_paragraph_style(p2, 'Heading 4')
+    assert p1._p.style == p2._p.style
+    assert p2.style.name == 'Heading 4'
+    assert styles.get_id(None, WD_STYLE_TYPE.PARAGRAPH) is None
+
+
+def test_table_styles():
+    doc = Document()
+    table = DocxTable(doc.add_paragraph(), width=doc._block_width)
+    table.make_base_headings()
+    r = table.add_row('1. Организация', p_style='Heading 6')
+    assert table.table.style.name == 'Table Grid'
+    assert table.table.rows[r].cells[0].paragraphs[0].style.name == 'Heading 6'
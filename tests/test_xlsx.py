@@ -1,6 +1,6 @@
 import pytest
 from pathlib import Path
-from xlsxparser import XlsxDataParser, TagData, XlsxData, Field, XlsxDataParserError
+from xlsxparser import XlsxDataParser, RowDataParser, TagData, XlsxData, Field, XlsxDataParserError
 from interfaces import DocxEnumTag
 
 XLSX_RESOURCE = Path('tests/samples/s1.xlsx')
@@ -58,3 +58,57 @@ def test_corrupt_xlsx():
         XlsxDataParser(Path('does not exist')).parse(TagData)
         XlsxDataParser(XLSX_RESOURCE_CORRUPT).parse(TagData)
 
+
+def test_parse_used_tags():
+    data = XlsxDataParser(XLSX_RESOURCE).parse(TagData, (DocxEnumTag.GROUP, DocxEnumTag.DIRECTOR))
+    assert isinstance(data.get(DocxEnumTag.GROUP).value, str)
+    assert isinstance(data.get(DocxEnumTag.DIRECTOR).value, str)
+    assert data.get(DocxEnumTag.TABLES).value == []
+    assert data.get(DocxEnumTag.KIND).value is None
+    assert data.get(DocxEnumTag.DIRECTOR_NAME).value is None
+
+    full = XlsxDataParser(XLSX_RESOURCE).parse(TagData)
+    data = XlsxDataParser(XLSX_RESOURCE).parse(TagData, (DocxEnumTag.TABLES,))
+    assert data.get(DocxEnumTag.TABLES).value == full.get(DocxEnumTag.TABLES).value
+
+
+class CountingParser(RowDataParser):
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+        self.read = 0
+
+    def _rows(self):
+        for row in self.rows:
+            self.read += 1
+            yield row
+
+
+def test_parse_stops_early():
+    rows = [('Группа', 'ИТси-210'), ('Курс', 2)] + [(None, f'Студент {i}', 'б') for i in range(1000)]
+    parser = CountingParser(rows)
+    assert parser.parse(TagData, (DocxEnumTag.GROUP,)).get(DocxEnumTag.GROUP).value == 'ИТси-210'
+    assert parser.read == 1
+    parser.read = 0
+    parser.parse(TagData, (DocxEnumTag.GROUP, DocxEnumTag.TABLES))
+    assert parser.read == len(rows)
+
+
+def test_parse_twice():
+    parser = XlsxDataParser(XLSX_RESOURCE)
+    first, second = parser.parse(TagData), parser.parse(TagData)
+    assert [f.value for f in first] == [f.value for f in second]
+
+
+def test_compact_data():
+    d1, d2 = TagData(), TagData()
+    assert not hasattr(d1, '__dict__')
+    assert d1.schema is d2.schema
+    d1.get(DocxEnumTag.GROUP)('ИТси-210')
+    d1.get(DocxEnumTag.TABLES)([('Организация', None)])
+    assert d1.get(DocxEnumTag.GROUP).value == 'ИТси-210'
+    assert d1.get_field('Группа').value == 'ИТси-210'
+    assert d2.get(DocxEnumTag.GROUP).value is None
+    assert d2.get(DocxEnumTag.TABLES).value == []
+    assert d1.get(DocxEnumTag.STUDENTS) is None
+    with pytest.raises(AttributeError):
+        d1.get(DocxEnumTag.GROUP).slot.rows = None
@@ -1,8 +1,10 @@
+from contextlib import closing
 from pathlib import Path
-from typing import Type, Iterator
+from typing import Type, Iterator, Iterable, BinaryIO
 
-from interfaces import Field, XlsxData, LineField, MultiField, raise_invalid_path, DocxEnumTag
+from interfaces import Field, XlsxData, FieldSlot, SlotField, TagSchema, raise_invalid_path, DocxEnumTag
 import openpyxl
+from openpyxl import Workbook
 
 
 class XlsxDataParserError(Exception):
@@ -11,90 +13,113 @@ class XlsxDataParserError(Exception):
 
 class TagData(XlsxData):
     """
-    Данные xlsx документа, которые можно ввести.
+    Данные xlsx документа, которые можно ввести. Описание полей хранится в общей схеме,
+    экземпляр хранит только массив значений.
     """
+    __slots__ = ('_values',)
+    schema = TagSchema((
+        ("Вид практики", DocxEnumTag.KIND, 1, 1),
+        ("Тип практики", DocxEnumTag.AIM, 1, 1),
+        ("Курс", DocxEnumTag.GRADE, 1, 1),
+        ("Факультет", DocxEnumTag.FACULTY, 1, 1),
+        ("Группа", DocxEnumTag.GROUP, 1, 1),
+        ("Форма обучения", DocxEnumTag.STUDY_TYPE, 1, 1),
+        ("Специализация", DocxEnumTag.SPECIALIZATION, 1, 1),
+        ("Период практики (годы)", DocxEnumTag.PERIOD_YEARS, 1, 1),
+        ("Период практики (дни)", DocxEnumTag.PERIOD_DAYS, 1, 1),
+        ("Кафедра", DocxEnumTag.PULPIT, 1, 1),
+        ("Должность руководителя практики", DocxEnumTag.DIRECTOR, 1, 1),
+        ("ФИО руководителя практики", DocxEnumTag.DIRECTOR_NAME, 1, 1),
+        ("Группа организаций. Имя организации. ФИО студентов, форма обучения", DocxEnumTag.TABLES, 2, None),
+    ))
+
     def __init__(self):
-        self.columns: dict[str, Field] = {
-            "Вид практики": LineField(1, DocxEnumTag.KIND),
-            "Тип практики": LineField(1, DocxEnumTag.AIM),
-            "Курс": LineField(1, DocxEnumTag.GRADE),
-            "Факультет": LineField(1, DocxEnumTag.FACULTY),
-            "Группа": LineField(1, DocxEnumTag.GROUP),
-            "Форма обучения": LineField(1, DocxEnumTag.STUDY_TYPE),
-            "Специализация": LineField(1, DocxEnumTag.SPECIALIZATION),
-            "Период практики (годы)": LineField(1, DocxEnumTag.PERIOD_YEARS),
-            "Период практики (дни)": LineField(1, DocxEnumTag.PERIOD_DAYS),
-            "Кафедра": LineField(1, DocxEnumTag.PULPIT),
-            "Должность руководителя практики": LineField(1, DocxEnumTag.DIRECTOR),
-            "ФИО руководителя практики": LineField(1, DocxEnumTag.DIRECTOR_NAME),
-            "Группа организаций. Имя организации. ФИО студентов, форма обучения":
-                MultiField(2, DocxEnumTag.TABLES),
-        }
+        self._values: list = self.schema.new_values()
+
+    def _field(self, slot: FieldSlot | None) -> Field | None:
+        return SlotField(slot, self._values) if slot else None
 
     def __iter__(self) -> Iterator[Field]:
-        return iter(filter(lambda x: x.value is not None, self.columns.values()))
+        return (SlotField(slot, self._values) for slot in self.schema.slots if self._values[slot.index] is not None)
 
     def help_iter(self) -> Iterator[tuple[str, Field]]:
-        return iter(self.columns.items())
+        return ((slot.canon, SlotField(slot, self._values)) for slot in self.schema.slots)
 
     def get_field(self, xlsx_field: str) -> Field | None:
-        return self.columns.get(xlsx_field)
+        return self._field(self.schema.by_canon(xlsx_field))
 
     def get(self, tag: DocxEnumTag) -> Field | None:
-        for f in self.columns.values():
-            if f.owner == tag:
-                return f
+        return self._field(self.schema.by_tag(tag))
 
     def get_unset_fields(self) -> tuple[tuple[str, Field]]:
         """ Возвращает кортэж из каноничного имени поля и самого поля. """
-        return tuple((s, field) for s, field in self.columns.items() if field.value is None)
+        return tuple((slot.canon, SlotField(slot, self._values)) for slot in self.schema.slots
+                     if self._values[slot.index] is None)
 
 
-class XlsxDataParser:
+class RowDataParser:
     """
-    Парсер данных xlsx документа.
+    Базовый парсер данных, представленных рядами в формате листа xlsx: в первой колонке
+    ключ поля, в следующих колонках значения. Ряды многострочного поля следуют за рядом
+    с ключом и имеют пустую первую колонку.
     """
+    streamable = False  # Парсер может читать уже прочитанное содержимое документа (параметр source).
 
-    def __init__(self, path: Path):
-        raise_invalid_path(path, XlsxDataParserError, exts=('.xlsx', '.xls'))
-        try:
-            wb_obj = openpyxl.load_workbook(path)
-        except OSError:
-            raise XlsxDataParserError(f'Документ "{path}" не является xls/xlsx документом.')
-        self.sheet = wb_obj.active
+    def _rows(self) -> Iterator[list[str]]:
+        """ Итератор по рядам источника данных. """
+        raise NotImplementedError
 
-    def parse(self, keeper: Type[XlsxData]) -> XlsxData:
+    def parse(self, keeper: Type[XlsxData], tags: Iterable[DocxEnumTag] = None) -> XlsxData:
         """
-        Парсит данные из xlsx файла path в хранилище данных keeper.
+        Парсит данные из источника в хранилище данных keeper.
 
         :param keeper: хранилище данных.
+        :param tags: тэги, значения которых необходимо извлечь, если None, то извлекаются все поля.
+            Ряды полей остальных тэгов пропускаются без сохранения значений. Если все тэги однострочные,
+            чтение источника прекращается, как только значения всех тэгов установлены.
         :return:
         """
         keep = keeper()
-        rows = self.sheet.iter_rows(values_only=True)
-        for row in rows:
-            self._set_xlsx_value_in_keeper(row, rows, keep)
+        tags = frozenset(tags) if tags is not None else None
+        # Поля, после установки значений которых остальные ряды можно не читать.
+        wanted = [keep.get(tag) for tag in tags] if tags is not None else None
+        if wanted is not None:
+            wanted = [field for field in wanted if field is not None]
+            if any(field.rows != 1 for field in wanted):  # многострочное поле может продолжаться до конца
+                wanted = None
+        with closing(self._rows()) as rows:
+            for row in rows:
+                self._set_xlsx_value_in_keeper(row, rows, keep, tags)
+                if wanted is not None and all(field.value is not None for field in wanted):
+                    break
         return keep
 
     @classmethod
-    def _set_xlsx_value_in_keeper(cls, row: list[str], rows: Iterator[list[str]], keeper: XlsxData):
+    def _set_xlsx_value_in_keeper(cls, row: list[str], rows: Iterator[list[str]], keeper: XlsxData,
+                                  tags: frozenset[DocxEnumTag] = None):
         """
         Устанавливает значение поля из xlsx в соответсвующее поле структуры data.
 
         :param row: текущий ряд.
         :param rows: генератор всех рядов.
         :param keeper: хранилище данных.
+        :param tags: тэги, значения которых необходимо извлечь.
         :return:
         """
         row_key = row[0]
         if field := cls._get_field(row_key, keeper):
+            skip = tags is not None and field.owner not in tags  # поле не используется в шаблоне
             if field.rows and field.rows == 1:
                 value = cls._extract_from_row(row, 1)
             else:
-                value, row = cls._extract_multi_row_value(rows, row, field.rows, field.columns)
+                if skip:
+                    row = cls._skip_multi_row_value(rows, field.rows)
+                else:
+                    value, row = cls._extract_multi_row_value(rows, row, field.rows, field.columns)
                 if row:
-                    cls._set_xlsx_value_in_keeper(row, rows, keeper)
-            field(value)
+                    cls._set_xlsx_value_in_keeper(row, rows, keeper, tags)
+            if not skip:
+                field(value)
 
     @staticmethod
     def _get_field(key: str, keeper: XlsxData) -> Field | None:
@@ -140,6 +165,60 @@ class XlsxDataParser:
                     break
         return values, last_row
 
+    @staticmethod
+    def _skip_multi_row_value(rows_iter: Iterator[list[str]], rows: int | None):
+        """
+        Пропускает ряды многострокового значения, не сохраняя их.
+
+        :param rows_iter: итератор по рядам.
+        :param rows: колличество рядов значений.
+        :return: Последний просмотренный ряд.
+        """
+        if rows:
+            for _ in range(rows):  # rows - 1 рядов значения и следующий за ними ряд
+                row = next(rows_iter)
+            return row
+        for row in rows_iter:
+            if not (any(row) and row[0] is None):
+                return row
+
     @staticmethod
     def _extract_from_row(row, cols: int):
-        return row[1] if cols == 1 else row[1:cols+1]
+        if cols == 1:
+            return row[1] if len(row) > 1 else None
+        values = tuple(row[1:cols+1])
+        return values + (None,) * (cols - len(values))  # короткий ряд дополняется пустыми значениями
+
+
+class XlsxDataParser(RowDataParser):
+    """
+    Парсер данных xlsx документа.
+    """
+    streamable = True
+
+    def __init__(self, path: Path, *, source: BinaryIO = None):
+        """
+        :param path: путь до xlsx документа.
+        :param source: уже прочитанное содержимое документа, path в этом случае используется только в сообщениях.
+        """
+        if source is None:
+            raise_invalid_path(path, XlsxDataParserError, exts=('.xlsx', '.xls'))
+        self.path = path
+        self.source = source
+        self._wb: Workbook | None = self._load()  # Книга открывается сразу, чтобы проверить формат документа.
+
+    def _load(self) -> Workbook:
+        """ Открывает книгу в режиме только для чтения: ряды читаются с диска по мере обхода. """
+        if self.source is not None:
+            self.source.seek(0)
+        try:
+            return openpyxl.load_workbook(self.source or self.path, read_only=True)
+        except OSError:
+            raise XlsxDataParserError(f'Документ "{self.path}" не является xls/xlsx документом.')
+
+    def _rows(self) -> Iterator[list[str]]:
+        wb, self._wb = self._wb or self._load(), None
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()